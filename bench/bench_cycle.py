@@ -0,0 +1,233 @@
+# end to end benchmark of poll cycles against a fake github api (bench/fake_github.py) and a
+# discord channel that just records what it's sent, nothing leaves the machine.
+# every repo count runs in its own process so the peak memory numbers don't mix
+# usage: python bench/bench_cycle.py [--repos 10 100 1000 10000] [--cycles 3] [--latency 0.01] [--concurrency 10]
+#        [--tokens 1] [--rate-limit 1000000] [--org-feed] [--events-only] [--digest 0] [--profile]
+#        [--duplicates 1] [--scheduled] [--burst 100]
+# --scheduled goes through the poll scheduler on a simulated clock instead of checking every repo
+# in every cycle, a cycle is then loop_time (the default 300) simulated seconds of poll_tick ticks.
+# a run close to a real token: --scheduled --rate-limit 5000, with the bot's default burst unless
+# --burst says otherwise. without --scheduled the cycles go back to back and the rate limit budget
+# has no time to refill in between
+import os
+import sys
+import time
+import json
+import socket
+import asyncio
+import argparse
+import resource
+import tempfile
+import subprocess
+import multiprocessing
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(BENCH_DIR, '..', 'src'))
+
+import aiohttp
+import fake_github
+
+TRACKED_EVENTS = ["PushEvent", "WatchEvent", "IssuesEvent", "IssueCommentEvent", "ForkEvent", "ReleaseEvent", "TaggedReleaseEvent"]
+
+class RecordingChannel:
+    def __init__(self):
+        self.messages = 0
+        self.embeds = 0
+
+    async def send(self, embeds):
+        self.messages += 1
+        self.embeds += len(embeds)
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+async def fake_stats(session, base):
+    async with session.get(f"{base}/_bench/stats") as resp:
+        return await resp.json()
+
+def total(stats):
+    return sum(stats['requests'].values()), stats['statuses'].get('304', 0)
+
+async def run_size(args, base):
+    # imported here, main reads its settings from the environment set up by single()
+    import main
+    channel = RecordingChannel()
+    main.outbox.get_channel = lambda channel_id: channel
+    main.outbox.interval = 0
+
+    if args.org_feed:
+        main.feeds.update(main.org_feeds.build_feeds({"feeds": [{"org": "bench"}]}))
+    tracked_events = [event for event in TRACKED_EVENTS if "Release" not in event] if args.events_only else TRACKED_EVENTS
+    repo_configs = []
+    for i in range(args.single):
+        for copy in range(args.duplicates):
+            # the same repo posting to different threads, like a config that lists it more than once
+            repo_config = {"name": f"bench/repo{i}", "url": f"{base}/repos/bench/repo{i}/events", "tracked_events": tracked_events}
+            if copy:
+                repo_config["thread_id"] = copy
+            if i % 4 == 0:
+                repo_config["tag_name"] = "nightly"
+            repo_configs.append(repo_config)
+    watchers = [main.make_watcher(repo_config, {}) for repo_config in repo_configs]
+    main.allrepos.extend(watchers)
+    endpoints = len({url for watcher in watchers for url in watcher.endpoints()})
+    now = [0.0]
+    if args.scheduled:
+        import scheduler
+        main.scheduler.clock = main.shared_fetch.fetcher.clock = lambda: now[0]
+        for token in main.token_pool.pool.tokens:
+            token.budget.clock = lambda: now[0]
+            token.budget.refilled = now[0]
+
+    async with aiohttp.ClientSession() as control:
+        start = time.perf_counter()
+        await main.bootstrap(watchers)
+        startup = time.perf_counter() - start
+
+        results = []
+        if args.scheduled:
+            main.scheduler.stagger(watchers)
+        if args.profile:
+            main.profiling.start(args.cycles, memory=True)
+        for cycle in range(args.cycles):
+            async with control.post(f"{base}/_bench/tick", params={"active": str(args.active)}) as resp:
+                await resp.read()
+            before = total(await fake_stats(control, base))
+            embeds_before = channel.embeds
+            start = time.perf_counter()
+            main.profiling.cycle_started()
+            for feed in main.feeds.values():
+                feed.next_check = 0
+            await main.poll_feeds()
+            if args.scheduled:
+                await scheduled_cycle(main, scheduler, now)
+            else:
+                await main.run_cycle(watchers)
+            await main.outbox.flush()
+            main.profiling.cycle_finished()
+            elapsed = time.perf_counter() - start
+            after = total(await fake_stats(control, base))
+            results.append({
+                "seconds": elapsed,
+                "requests": after[0] - before[0],
+                "not_modified": after[1] - before[1],
+                "embeds": channel.embeds - embeds_before,
+            })
+
+        # a restart: the same repos again from what the state store has for them
+        main.save_repository_states(watchers)
+        for watcher in watchers:
+            main.drop_watcher(watcher)
+        saved_states = main.state_store.load_all()
+        watchers = [main.make_watcher(repo_config, saved_states.get(main.repo_key(repo_config), {})) for repo_config in repo_configs]
+        main.allrepos.extend(watchers)
+        before = total(await fake_stats(control, base))
+        start = time.perf_counter()
+        await main.bootstrap(watchers)
+        warm_startup = time.perf_counter() - start
+        warm_requests = total(await fake_stats(control, base))[0] - before[0]
+
+    await main.github_http.close()
+    main.state_store.close()
+    return {
+        "repos": args.single,
+        "endpoints": endpoints,
+        "startup": startup,
+        "warm_startup": warm_startup,
+        "warm_requests": warm_requests,
+        "cycles": results,
+        "messages": channel.messages,
+        "deferred": sum(token.budget.deferred for token in main.token_pool.pool.tokens),
+        "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    }
+
+async def scheduled_cycle(main, scheduler, now):
+    # loop_time simulated seconds of ticks, checking what the scheduler says is due like run_tick
+    end = now[0] + scheduler.loop_time
+    while now[0] < end:
+        now[0] += main.poll_tick
+        due = main.scheduler.pop_due()
+        if due:
+            await main.run_cycle(due)
+            for watcher in due:
+                main.scheduler.reschedule(watcher)
+
+def single(args):
+    port = free_port()
+    ready = multiprocessing.Event()
+    server = multiprocessing.Process(target=fake_github.serve, args=(port, args.latency, ready, args.rate_limit), daemon=True)
+    server.start()
+    ready.wait(10)
+    state_dir = tempfile.mkdtemp()
+    os.environ.update({
+        "github_api": f"http://127.0.0.1:{port}",
+        "state_file": os.path.join(state_dir, "state.db"),
+        "channel_id": "1",
+        "git_tokens": ",".join(f"bench{i}" for i in range(args.tokens)),
+        "max_concurrency": str(args.concurrency),
+        "log_level": "CRITICAL",
+        # back to back cycles, scheduled runs keep the real poll intervals
+        "loop_time": "300" if args.scheduled else "1",
+        "digest_threshold": str(args.digest),
+    })
+    if args.burst:
+        os.environ["rate_limit_burst"] = str(args.burst)
+    try:
+        result = asyncio.run(run_size(args, f"http://127.0.0.1:{port}"))
+    finally:
+        server.terminate()
+    print(json.dumps(result))
+
+def report(result):
+    cycles = result["cycles"]
+    seconds = sum(c["seconds"] for c in cycles)
+    requests = sum(c["requests"] for c in cycles)
+    not_modified = sum(c["not_modified"] for c in cycles)
+    embeds = sum(c["embeds"] for c in cycles)
+    print(f"{result['repos']:>7} {result['startup']:9.2f} {result['warm_startup']:9.2f} {result['warm_requests']:8} {seconds / len(cycles):9.2f} {requests / len(cycles):10.0f} "
+          f"{requests / len(cycles) / result['endpoints']:8.2f} {not_modified / max(requests, 1):7.1%} {embeds / len(cycles):9.0f} {embeds / seconds if seconds else 0:9.0f} "
+          f"{result['deferred']:9} {result['peak_rss_mb']:9.1f}")
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--repos', type=int, nargs='+', default=[10, 100, 1000, 10000])
+    parser.add_argument('--cycles', type=int, default=3)
+    parser.add_argument('--latency', type=float, default=0.01, help='seconds added to every fake api response')
+    parser.add_argument('--concurrency', type=int, default=10, help='max_concurrency for the bot')
+    parser.add_argument('--active', type=float, default=0.1, help='share of repos with new activity each cycle')
+    parser.add_argument('--tokens', type=int, default=1, help='size of the token pool')
+    parser.add_argument('--rate-limit', type=int, default=1000000, help='requests per token the fake api allows')
+    parser.add_argument('--org-feed', action='store_true', help='get events from the org feed instead of per repo')
+    parser.add_argument('--events-only', action='store_true', help="don't track releases, so only events are polled")
+    parser.add_argument('--burst', type=int, help='rate_limit_burst for the bot (default: its own default)')
+    parser.add_argument('--digest', type=int, default=0, help='digest_threshold for the bot')
+    parser.add_argument('--profile', action='store_true', help='write a cProfile/tracemalloc report of the cycles to profile_dir')
+    parser.add_argument('--duplicates', type=int, default=1, help='times every repo is in the config, to measure shared requests')
+    parser.add_argument('--scheduled', action='store_true', help='check repos when the poll scheduler says so, on a simulated clock')
+    parser.add_argument('--single', type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.single:
+        single(args)
+        return
+
+    print(f"{'repos':>7} {'startup s':>9} {'warm s':>9} {'warm req':>8} {'cycle s':>9} {'req/cycle':>10} {'req/url':>8} {'304':>7} {'embeds':>9} {'embeds/s':>9} {'deferred':>9} {'rss MB':>9}")
+    for repos in args.repos:
+        command = [sys.executable, os.path.abspath(__file__), '--single', str(repos), '--cycles', str(args.cycles),
+                   '--latency', str(args.latency), '--concurrency', str(args.concurrency), '--active', str(args.active),
+                   '--tokens', str(args.tokens), '--rate-limit', str(args.rate_limit), '--digest', str(args.digest),
+                   '--duplicates', str(args.duplicates)]
+        command += ['--scheduled'] * args.scheduled
+        command += ['--burst', str(args.burst)] if args.burst else []
+        command += ['--profile'] * args.profile
+        command += ['--org-feed'] * args.org_feed + ['--events-only'] * args.events_only
+        output = subprocess.run(command, capture_output=True, text=True)
+        if output.returncode != 0:
+            print(f"{repos:>7} failed:\n{output.stderr}")
+            continue
+        report(json.loads(output.stdout.strip().splitlines()[-1]))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,44 @@
+# micro benchmark for decoding + rendering embeds, per event type
+# usage: python bench/bench_embeds.py [-n 2000] [--payloads bench/payloads/events.json]
+import os
+import sys
+import json
+import time
+import argparse
+from collections import defaultdict
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+import decode
+from make_embed import MakeEmbed
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-n', type=int, default=2000, help='renders per payload')
+    parser.add_argument('--payloads', default=os.path.join(os.path.dirname(os.path.abspath(__file__)), 'payloads', 'events.json'))
+    args = parser.parse_args()
+
+    with open(args.payloads) as f:
+        events = json.load(f)
+
+    timings = defaultdict(lambda: [0, 0.0, 0.0])
+    for event in events:
+        key = f"{event['type']}/{(event.get('payload') or {}).get('action', '-')}"
+        start = time.perf_counter()
+        for _ in range(args.n):
+            record = decode.decode_event(event)
+        decoded = time.perf_counter()
+        for _ in range(args.n):
+            MakeEmbed(record)
+        rendered = time.perf_counter()
+        timing = timings[key]
+        timing[0] += args.n
+        timing[1] += decoded - start
+        timing[2] += rendered - decoded
+
+    print(f"{'event':32} {'decode us':>10} {'render us':>10} {'embeds/s':>10}")
+    for key, (count, decode_time, render_time) in sorted(timings.items()):
+        print(f"{key:32} {decode_time / count * 1e6:10.1f} {render_time / count * 1e6:10.1f} {count / (decode_time + render_time):10.0f}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,98 @@
+# memory taken by the watchers themselves for 1k/10k/50k repos, measured with tracemalloc.
+# every watcher is built the way it is after a restart: from a config entry plus saved state with
+# a full seen index, etags and (for every 4th repo) tracked release assets. the config dicts are
+# made before measuring, they're what config.json costs either way.
+# every repo count runs in its own process. peak rss includes the saved states, which are
+# freed again once the watchers are built
+# usage: python bench/bench_memory.py [--repos 1000 10000 50000] [--fresh]
+import os
+import sys
+import json
+import argparse
+import resource
+import tempfile
+import subprocess
+import tracemalloc
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(BENCH_DIR, '..', 'src'))
+
+TRACKED_EVENTS = ["PushEvent", "WatchEvent", "IssuesEvent", "IssueCommentEvent", "ForkEvent", "ReleaseEvent", "TaggedReleaseEvent"]
+API = "https://api.github.com"
+
+def saved_state(i, fresh):
+    if fresh:
+        return {}
+    first_event = 40000000000 + i * 1000
+    first_release = 100000000 + i * 100
+    state = {
+        "etag": f'W/"{i:064x}"',
+        "last_event_id": str(first_event + 299),
+        "releases_etag": f'W/"{i + 1:064x}"',
+        "last_release_id": first_release + 9,
+        "tag_etag": f'W/"{i + 2:064x}"' if i % 4 == 0 else "",
+        "seen_event_ids": list(range(first_event, first_event + 300)),
+        "seen_event_floor": first_event - 1,
+        "seen_release_ids": list(range(first_release, first_release + 10)),
+        "seen_release_floor": 0,
+        "tracked_asset_ids": list(range(i * 20, i * 20 + 10)) if i % 4 == 0 else [],
+        "tracked_asset_signatures": list(range(1000, 1010)) if i % 4 == 0 else [],
+    }
+    # round trip like the state store does, so nothing is shared that wouldn't be
+    return json.loads(json.dumps(state))
+
+def single(repos, fresh):
+    os.environ.update({
+        "state_file": os.path.join(tempfile.mkdtemp(), "state.db"),
+        "channel_id": "1",
+        "log_level": "CRITICAL",
+    })
+    import main
+
+    configs = []
+    for i in range(repos):
+        config = {"name": f"org{i % 50}/repo{i}", "url": f"{API}/repos/org{i % 50}/repo{i}/events", "tracked_events": list(TRACKED_EVENTS)}
+        if i % 4 == 0:
+            config["tag_name"] = "nightly"
+        configs.append(config)
+
+    # the saved states are traced too, whatever the watchers keep of them counts, the rest
+    # is freed once the watchers are built, same as in on_ready
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    states = [saved_state(i, fresh) for i in range(repos)]
+    watchers = [main.make_watcher(config, state) for config, state in zip(configs, states)]
+    main.allrepos.extend(watchers)
+    del states
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    print(json.dumps({
+        "repos": repos,
+        "bytes": after - before,
+        "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    }))
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--repos', type=int, nargs='+', default=[1000, 10000, 50000])
+    parser.add_argument('--fresh', action='store_true', help='watchers without saved state, as on a first start')
+    parser.add_argument('--single', type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.single:
+        single(args.single, args.fresh)
+        return
+
+    print(f"{'repos':>7} {'watchers MB':>12} {'per watcher':>12} {'peak rss MB':>12}")
+    for repos in args.repos:
+        command = [sys.executable, os.path.abspath(__file__), '--single', str(repos)] + ['--fresh'] * args.fresh
+        output = subprocess.run(command, capture_output=True, text=True)
+        if output.returncode != 0:
+            print(f"{repos:>7} failed:\n{output.stderr}")
+            continue
+        result = json.loads(output.stdout.strip().splitlines()[-1])
+        print(f"{result['repos']:>7} {result['bytes'] / 1024 / 1024:12.1f} {result['bytes'] / result['repos']:10.0f} B "
+              f"{result['peak_rss_mb']:12.1f}")
+
+if __name__ == '__main__':
+    main()
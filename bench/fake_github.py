@@ -0,0 +1,223 @@
+# a stand-in for the bits of the github rest api the bot uses, for the offline benchmarks.
+# serves /repos/{owner}/{repo}/events, /releases, /releases/tags/{tag}, /orgs/{org}/events and /rate_limit with
+# etags, 304s, Link pagination, an optional injected latency and an optional per token rate limit
+# (304s are free, like on github). repos are created on first use.
+# /_bench/tick makes some repos active, /_bench/stats returns request counters
+import time
+import json
+import random
+import asyncio
+from collections import Counter
+from aiohttp import web
+
+EVENTS_PER_PAGE = 30
+MAX_EVENTS = 300
+EVENT_TYPES = ["PushEvent", "WatchEvent", "IssuesEvent", "IssueCommentEvent", "ForkEvent"]
+
+class FakeRepo:
+    __slots__ = ('name', 'events', 'releases', 'events_version', 'releases_version', 'tag_version')
+
+    def __init__(self, name):
+        self.name = name
+        self.events = []
+        self.releases = []
+        self.events_version = 0
+        self.releases_version = 0
+        self.tag_version = 0
+
+class FakeGitHub:
+    def __init__(self, latency=0.0, seed=1, limit=1000000):
+        self.latency = latency
+        self.limit = limit
+        self.reset = int(time.time()) + 3600
+        self.used = Counter()
+        self.random = random.Random(seed)
+        self.repos = {}
+        self.next_event_id = 30000000000
+        self.next_release_id = 100000
+        self.next_asset_id = 500000
+        self.requests = Counter()
+        self.statuses = Counter()
+
+    def repo(self, owner, name):
+        full_name = f"{owner}/{name}"
+        repo = self.repos.get(full_name)
+        if repo is None:
+            repo = self.repos[full_name] = FakeRepo(full_name)
+            self.add_events(repo, EVENTS_PER_PAGE)
+            self.add_release(repo)
+        return repo
+
+    def make_event(self, repo, event_type):
+        self.next_event_id += 1
+        login = f"user{self.random.randint(1, 500)}"
+        event = {
+            "id": str(self.next_event_id),
+            "type": event_type,
+            "actor": {"id": 1, "login": login, "avatar_url": f"https://avatars.githubusercontent.com/u/1?{login}"},
+            "repo": {"id": 1, "name": repo.name, "url": f"https://api.github.com/repos/{repo.name}"},
+            "public": True,
+            "created_at": "2024-05-02T10:00:00Z",
+        }
+        if event_type == "PushEvent":
+            commits = [{"sha": "%040x" % self.random.getrandbits(160), "author": {"name": login, "email": "dev@example.com"},
+                        "message": f"commit {i}", "distinct": True, "url": f"https://api.github.com/repos/{repo.name}/commits/{i}"} for i in range(self.random.randint(1, 5))]
+            event["payload"] = {"ref": "refs/heads/main", "before": "b" * 40, "head": "h" * 40, "size": len(commits), "commits": commits}
+        elif event_type == "WatchEvent":
+            event["payload"] = {"action": "started"}
+        elif event_type == "ForkEvent":
+            event["payload"] = {"forkee": {"full_name": f"{login}/{repo.name.split('/')[1]}"}}
+        else:
+            number = self.random.randint(1, 1000)
+            issue = {"html_url": f"https://github.com/{repo.name}/issues/{number}", "number": number, "title": "Something broke",
+                     "body": "Steps to reproduce: " * 20, "state_reason": None}
+            event["payload"] = {"action": "opened", "issue": issue}
+            if event_type == "IssueCommentEvent":
+                event["payload"] = {"action": "created", "issue": issue, "comment": {"body": "Same here. " * 10}}
+        return event
+
+    def add_events(self, repo, count):
+        new_events = [self.make_event(repo, self.random.choice(EVENT_TYPES)) for _ in range(count)]
+        repo.events[:0] = reversed(new_events)
+        del repo.events[MAX_EVENTS:]
+        repo.events_version += 1
+
+    def add_release(self, repo):
+        self.next_release_id += 1
+        tag = f"v1.{len(repo.releases)}.0"
+        repo.releases.insert(0, {
+            "id": self.next_release_id, "tag_name": tag, "name": tag, "draft": False, "prerelease": False,
+            "html_url": f"https://github.com/{repo.name}/releases/tag/{tag}",
+            "published_at": "2024-05-02T10:00:00Z", "updated_at": "2024-05-02T10:00:00Z",
+            "author": {"login": "releaser", "html_url": "https://github.com/releaser", "avatar_url": "https://avatars.githubusercontent.com/u/2"},
+            "body": "changes\n" * 50, "assets": [],
+        })
+        repo.releases_version += 1
+
+    def nightly(self, repo):
+        self.next_asset_id += 1
+        return {
+            "id": 1, "tag_name": "nightly", "name": "nightly", "html_url": f"https://github.com/{repo.name}/releases/tag/nightly",
+            "updated_at": "2024-05-02T10:00:00Z", "author": None,
+            "assets": [{"id": 400000 + repo.tag_version * 10 + i, "name": f"build-{i}.zip", "size": 1024 * 1024, "updated_at": f"v{repo.tag_version}",
+                        "browser_download_url": f"https://github.com/{repo.name}/releases/download/nightly/build-{i}.zip"} for i in range(3)],
+        }
+
+    def remaining(self, request):
+        return self.limit - self.used[request.headers.get("Authorization", "")]
+
+    def headers(self, request, etag=None):
+        headers = {
+            "X-RateLimit-Limit": str(self.limit),
+            "X-RateLimit-Remaining": str(max(self.remaining(request), 0)),
+            "X-RateLimit-Reset": str(self.reset),
+            "X-RateLimit-Resource": "core",
+        }
+        if etag:
+            headers["ETag"] = etag
+        return headers
+
+    def respond(self, request, kind, body, etag, extra=None):
+        self.requests[kind] += 1
+        if etag and request.headers.get("If-None-Match") == etag:
+            self.statuses[304] += 1
+            headers = self.headers(request, etag)
+            headers.update(extra or {})
+            return web.Response(status=304, headers=headers)
+        if self.remaining(request) <= 0:
+            self.statuses[403] += 1
+            return web.json_response({"message": "API rate limit exceeded"}, status=403, headers=self.headers(request))
+        self.used[request.headers.get("Authorization", "")] += 1
+        headers = self.headers(request, etag)
+        headers.update(extra or {})
+        self.statuses[200] += 1
+        return web.Response(body=json.dumps(body), content_type="application/json", headers=headers)
+
+    async def delay(self):
+        if self.latency:
+            await asyncio.sleep(self.latency)
+
+    async def events(self, request):
+        await self.delay()
+        repo = self.repo(request.match_info['owner'], request.match_info['repo'])
+        page = int(request.query.get('page', 1))
+        per_page = int(request.query.get('per_page', EVENTS_PER_PAGE))
+        start = (page - 1) * per_page
+        body = repo.events[start:start + per_page]
+        extra = {"X-Poll-Interval": "60"}
+        if start + per_page < len(repo.events):
+            extra["Link"] = f'<{request.url.with_query(page=page + 1, per_page=per_page)}>; rel="next"'
+        return self.respond(request, "events", body, f'"{repo.name}-e{repo.events_version}-p{page}"', extra)
+
+    async def org_events(self, request):
+        # every event of the org's repos that the fake has seen so far, newest first
+        await self.delay()
+        org = request.match_info['org']
+        repos = [repo for name, repo in self.repos.items() if name.split('/', 1)[0] == org]
+        events = sorted((event for repo in repos for event in repo.events), key=lambda event: int(event['id']), reverse=True)[:MAX_EVENTS]
+        version = sum(repo.events_version for repo in repos)
+        page = int(request.query.get('page', 1))
+        per_page = int(request.query.get('per_page', EVENTS_PER_PAGE))
+        start = (page - 1) * per_page
+        extra = {"X-Poll-Interval": "60"}
+        if start + per_page < len(events):
+            extra["Link"] = f'<{request.url.with_query(page=page + 1, per_page=per_page)}>; rel="next"'
+        return self.respond(request, "org_events", events[start:start + per_page], f'"{org}-e{version}-{len(repos)}-p{page}"', extra)
+
+    async def releases(self, request):
+        await self.delay()
+        repo = self.repo(request.match_info['owner'], request.match_info['repo'])
+        per_page = int(request.query.get('per_page', 30))
+        return self.respond(request, "releases", repo.releases[:per_page], f'"{repo.name}-r{repo.releases_version}-{per_page}"')
+
+    async def tag(self, request):
+        await self.delay()
+        repo = self.repo(request.match_info['owner'], request.match_info['repo'])
+        if request.match_info['tag'] != "nightly":
+            self.requests["tag"] += 1
+            self.statuses[404] += 1
+            return web.json_response({"message": "Not Found"}, status=404, headers=self.headers(request))
+        return self.respond(request, "tag", self.nightly(repo), f'"{repo.name}-t{repo.tag_version}"')
+
+    async def rate_limit(self, request):
+        self.requests["rate_limit"] += 1
+        self.statuses[200] += 1
+        core = {"limit": self.limit, "remaining": max(self.remaining(request), 0), "reset": self.reset}
+        return web.json_response({"resources": {"core": core}}, headers=self.headers(request))
+
+    async def tick(self, request):
+        # a share of the repos gets new events, and a smaller share a release / changed nightly assets
+        active = float(request.query.get('active', 0.1))
+        for repo in self.repos.values():
+            if self.random.random() < active:
+                self.add_events(repo, self.random.randint(1, 5))
+            if self.random.random() < active / 5:
+                self.add_release(repo)
+            if self.random.random() < active / 5:
+                repo.tag_version += 1
+        return web.json_response({"repos": len(self.repos)})
+
+    async def stats(self, request):
+        return web.json_response({"requests": dict(self.requests), "statuses": {str(k): v for k, v in self.statuses.items()}})
+
+    def app(self):
+        app = web.Application()
+        app.router.add_get('/repos/{owner}/{repo}/events', self.events)
+        app.router.add_get('/repos/{owner}/{repo}/releases', self.releases)
+        app.router.add_get('/repos/{owner}/{repo}/releases/tags/{tag}', self.tag)
+        app.router.add_get('/orgs/{org}/events', self.org_events)
+        app.router.add_get('/rate_limit', self.rate_limit)
+        app.router.add_post('/_bench/tick', self.tick)
+        app.router.add_get('/_bench/stats', self.stats)
+        return app
+
+def serve(port, latency, ready=None, limit=1000000):
+    # run in its own process by the benchmarks so the server's memory isn't counted against the bot
+    async def run():
+        runner = web.AppRunner(FakeGitHub(latency, limit=limit).app(), access_log=None)
+        await runner.setup()
+        await web.TCPSite(runner, '127.0.0.1', port).start()
+        if ready is not None:
+            ready.set()
+        await asyncio.Event().wait()
+    asyncio.run(run())
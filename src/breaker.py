@@ -0,0 +1,49 @@
+import os
+import time
+import random
+
+# failures in a row before a repo or endpoint is left alone for a while
+breaker_threshold = int(os.getenv('breaker_threshold', 3))
+# the first pause, doubled every time the retry after it fails too, up to breaker_max_backoff
+breaker_backoff = int(os.getenv('breaker_backoff', os.getenv('loop_time', 300)))
+breaker_max_backoff = int(os.getenv('breaker_max_backoff', 6 * 3600))
+
+class Breaker:
+    # circuit breaker for a repo or one of its endpoints. after breaker_threshold failures in a row
+    # it opens and requests are skipped until retry_at, then one request goes through: a success
+    # closes it again, a failure opens it for twice as long (with jitter, so repos that broke
+    # together don't all retry in the same cycle)
+    __slots__ = ('failures', 'opens', 'retry_at', 'reason')
+
+    def __init__(self):
+        self.failures = 0
+        self.opens = 0
+        self.retry_at = 0.0
+        self.reason = ''
+
+    def allows(self):
+        return time.monotonic() >= self.retry_at
+
+    def is_open(self):
+        return self.opens > 0
+
+    def success(self):
+        # returns True if it was open, i.e. the repo/endpoint just recovered
+        recovered = self.opens > 0
+        self.failures = 0
+        self.opens = 0
+        self.retry_at = 0.0
+        self.reason = ''
+        return recovered
+
+    def failure(self, reason):
+        # returns the seconds it opened for, 0 while it's still below the threshold
+        self.failures += 1
+        self.reason = reason
+        if self.failures < breaker_threshold:
+            return 0
+        self.opens += 1
+        delay = min(breaker_max_backoff, breaker_backoff * 2 ** (self.opens - 1))
+        delay *= 0.5 + random.random() / 2
+        self.retry_at = time.monotonic() + delay
+        return delay
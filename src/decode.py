@@ -0,0 +1,141 @@
+import json
+
+# orjson is optional, it's a lot quicker on big pages but plain json works the same
+try:
+    import orjson
+    loads = orjson.loads
+except ImportError:
+    loads = json.loads
+
+class EventRecord:
+    # just the parts of an event the embeds use, everything else in the payload is dropped
+    __slots__ = ('id', 'type', 'action', 'actor', 'avatar_url', 'repo', 'html_url', 'number', 'title',
+                 'body', 'state_reason', 'merged', 'forkee', 'tag_name', 'ref', 'before', 'head', 'size', 'commits')
+
+    def __init__(self, id, type, action=None, actor='', avatar_url='', repo=''):
+        self.id = id
+        self.type = type
+        self.action = action
+        self.actor = actor
+        self.avatar_url = avatar_url
+        self.repo = repo
+        self.html_url = None
+        self.number = None
+        self.title = None
+        self.body = None
+        self.state_reason = None
+        self.merged = None
+        self.forkee = None
+        self.tag_name = None
+        self.ref = None
+        self.before = None
+        self.head = None
+        self.size = None
+        self.commits = None
+
+class CommitRecord:
+    __slots__ = ('sha', 'url', 'message', 'author')
+
+    def __init__(self, sha, url, message, author):
+        self.sha = sha
+        self.url = url
+        self.message = message
+        self.author = author
+
+class ReleaseRecord:
+    __slots__ = ('id', 'tag_name', 'name', 'html_url', 'prerelease', 'draft', 'published_at', 'updated_at',
+                 'author_login', 'author_url', 'author_avatar', 'assets')
+
+    def __init__(self, id, tag_name, name, html_url, prerelease, draft, published_at, updated_at, author, assets):
+        self.id = id
+        self.tag_name = tag_name
+        self.name = name
+        self.html_url = html_url
+        self.prerelease = prerelease
+        self.draft = draft
+        self.published_at = published_at
+        self.updated_at = updated_at
+        self.author_login = author['login'] if author else None
+        self.author_url = author['html_url'] if author else None
+        self.author_avatar = author['avatar_url'] if author else None
+        self.assets = assets
+
+class AssetRecord:
+    __slots__ = ('id', 'name', 'size', 'updated_at', 'browser_download_url')
+
+    def __init__(self, id, name, size, updated_at, browser_download_url):
+        self.id = id
+        self.name = name
+        self.size = size
+        self.updated_at = updated_at
+        self.browser_download_url = browser_download_url
+
+def project_issue_comment(record, payload):
+    record.html_url = payload['issue']['html_url']
+    record.number = payload['issue']['number']
+    record.body = payload['comment']['body']
+
+def project_issues(record, payload):
+    issue = payload['issue']
+    record.html_url = issue['html_url']
+    record.number = issue['number']
+    record.title = issue['title']
+    record.body = issue['body']
+    record.state_reason = issue.get('state_reason')
+
+def project_pull_request(record, payload):
+    pull_request = payload['pull_request']
+    record.html_url = pull_request['html_url']
+    record.number = payload['number']
+    record.title = pull_request['title']
+    record.body = pull_request['body']
+    record.merged = pull_request.get('merged')
+
+def project_fork(record, payload):
+    record.forkee = payload['forkee']['full_name']
+
+def project_release(record, payload):
+    record.html_url = payload['release']['html_url']
+    record.tag_name = payload['release']['tag_name']
+    record.body = payload['release']['body']
+
+def project_push(record, payload):
+    record.ref = payload.get('ref')
+    record.before = payload['before']
+    record.head = payload['head']
+    commits = payload.get('commits', [])
+    record.size = payload.get('size', len(commits))
+    record.commits = [CommitRecord(c['sha'], c['url'], c['message'], c['author']['name']) for c in commits]
+
+PROJECTIONS = {
+    "WatchEvent": None,
+    "IssueCommentEvent": project_issue_comment,
+    "IssuesEvent": project_issues,
+    "PullRequestEvent": project_pull_request,
+    "ForkEvent": project_fork,
+    "ReleaseEvent": project_release,
+    "PushEvent": project_push,
+}
+
+def decode_event(event):
+    payload = event.get('payload') or {}
+    record = EventRecord(str(event['id']), event['type'], payload.get('action'),
+                         event['actor']['login'], event['actor']['avatar_url'], event['repo']['name'])
+    project = PROJECTIONS.get(event['type'])
+    if project:
+        project(record, payload)
+    return record
+
+def decode_events(events, tracked_events):
+    # the type check comes first so untracked events never get turned into records
+    return [decode_event(event) for event in events if event['type'] in tracked_events]
+
+def decode_asset(asset):
+    return AssetRecord(asset['id'], asset['name'], asset.get('size', 0), asset.get('updated_at'), asset['browser_download_url'])
+
+def decode_release(release, with_assets=False):
+    # /releases pages carry every asset of every release, only the tagged release check needs them
+    assets = [decode_asset(asset) for asset in release.get('assets', [])] if with_assets else None
+    return ReleaseRecord(release['id'], release['tag_name'], release.get('name'), release.get('html_url', ''),
+                         release.get('prerelease', False), release.get('draft', False), release.get('published_at'),
+                         release.get('updated_at'), release.get('author'), assets)
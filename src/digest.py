@@ -0,0 +1,63 @@
+import os
+
+# a burst of at least this many pushes to one branch, comments on one issue/pr, stars or forks in
+# one check is sent as a single digest embed. 0 (default) sends every event on its own,
+# "digest_threshold" on a repository in config.json overrides it for that repository
+digest_threshold = int(os.getenv('digest_threshold', 0))
+# names shown before the rest are just counted
+MAX_ACTORS = 3
+
+class DigestRecord:
+    # stands in for a run of events of one kind, make_embed renders it with the (type, "digest") renderer
+    __slots__ = ('id', 'type', 'action', 'actor', 'avatar_url', 'repo', 'events')
+
+    def __init__(self, events):
+        last = events[-1]
+        self.id = last.id
+        self.type = last.type
+        self.action = 'digest'
+        self.actor = actor_names(events)
+        self.avatar_url = last.avatar_url
+        self.repo = last.repo
+        # the merged decode.EventRecords, oldest first
+        self.events = events
+
+def actor_names(events):
+    actors = list(dict.fromkeys(event.actor for event in events))
+    if len(actors) <= MAX_ACTORS:
+        return ', '.join(actors)
+    return f"{', '.join(actors[:MAX_ACTORS])} and {len(actors) - MAX_ACTORS} others"
+
+def digest_key(record):
+    # events with the same key merge into one digest, None for events that are always sent on their own
+    if record.type == "PushEvent":
+        return record.type, record.ref
+    if record.type == "IssueCommentEvent" and record.action == "created":
+        return record.type, record.number
+    if record.type in ("WatchEvent", "ForkEvent"):
+        return (record.type,)
+    return None
+
+def coalesce(records, threshold):
+    # records are oldest first, every group of threshold or more events is replaced by one
+    # DigestRecord where its newest event was, everything else passes through untouched
+    if threshold <= 0:
+        return records
+    threshold = max(threshold, 2)
+    groups = {}
+    for record in records:
+        key = digest_key(record)
+        if key is not None:
+            groups.setdefault(key, []).append(record)
+    digests = {id(group[-1]): group for group in groups.values() if len(group) >= threshold}
+    if not digests:
+        return records
+
+    merged = {id(record) for group in digests.values() for record in group}
+    coalesced = []
+    for record in records:
+        if id(record) in digests:
+            coalesced.append(DigestRecord(digests[id(record)]))
+        elif id(record) not in merged:
+            coalesced.append(record)
+    return coalesced
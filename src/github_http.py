@@ -0,0 +1,102 @@
+import os
+import time
+import aiohttp
+import decode
+import metrics
+import token_pool
+
+# overridable so the bot can be pointed at a github enterprise server (or the fake one in bench/)
+API_URL = os.getenv('github_api', 'https://api.github.com').rstrip('/')
+http_timeout = int(os.getenv('http_timeout', 30))
+max_connections = int(os.getenv('max_connections', 50))
+
+_session = None
+
+class Response:
+    # mirrors the bits of urllib3's response the watchers used (status/headers/data)
+    __slots__ = ('status', 'headers', 'data', 'url', 'parsed')
+
+    def __init__(self, status, headers, data, url, parsed=None):
+        self.status = status
+        self.headers = headers
+        self.data = data
+        self.url = url
+        self.parsed = parsed
+
+    def json(self):
+        # parsed once, shared responses hand the same object to every watcher so don't mutate it
+        if self.parsed is None:
+            self.parsed = decode.loads(self.data)
+        return self.parsed
+
+def get_session():
+    # one session (and so one connection pool) shared by every watcher, created lazily
+    # so it binds to the loop discord.py is running on
+    global _session
+    if _session is None or _session.closed:
+        connector = aiohttp.TCPConnector(limit=max_connections, ttl_dns_cache=300)
+        _session = aiohttp.ClientSession(connector=connector, timeout=aiohttp.ClientTimeout(total=http_timeout))
+    return _session
+
+def token_for(url):
+    # the token a repo's requests go out with, see token_pool.py
+    return token_pool.pool.for_key(repo_label(url))
+
+async def request(method, url, headers=None, timeout=http_timeout, token=None, label=None, **kwargs):
+    # label: the repo (or orgs/{org}) a url belongs to when the url doesn't say, pagination links and
+    # /repositories/{id} lookups, so their time lands in the right series. token: defaults to the label's
+    label = label or repo_label(url)
+    token = token or token_pool.pool.for_key(label)
+    request_headers = dict(token.headers)
+    if headers:
+        request_headers.update(headers)
+    # redirects come back as they are, a 301 means the repo was renamed and the watcher moves itself over
+    kwargs.setdefault('allow_redirects', False)
+    session = get_session()
+    start = time.perf_counter()
+    try:
+        async with session.request(method, url, headers=request_headers, timeout=aiohttp.ClientTimeout(total=timeout), **kwargs) as resp:
+            data = await resp.read()
+    except Exception:
+        metrics.request_errors.inc()
+        raise
+    elapsed = time.perf_counter() - start
+    metrics.request_latency.observe(elapsed, label)
+    metrics.stage_seconds.inc('fetch', label, amount=elapsed)
+    metrics.request_status.inc(metrics.status_label(resp.status))
+    token.budget.update(resp.headers)
+    if resp.status != 304:
+        # conditional requests that come back 304 don't count against the rate limit
+        token.budget.charge()
+    return Response(resp.status, resp.headers, data, str(resp.url))
+
+def repo_name_from_url(url):
+    # https://api.github.com/repos/{owner}/{repo}/events -> {owner}/{repo}
+    return url.split('/repos/', 1)[-1].replace('/events', '')
+
+def repo_label(url):
+    # {owner}/{repo} for anything under /repos/, so events/releases/tag requests land in one series,
+    # orgs/{org} for org feeds
+    parts = url.split('/repos/', 1)
+    if len(parts) == 2:
+        return '/'.join(parts[1].split('/', 2)[:2])
+    parts = url.split('/orgs/', 1)
+    if len(parts) == 2:
+        return 'orgs/' + parts[1].split('/', 1)[0]
+    return url.rsplit('/', 1)[-1].split('?', 1)[0]
+
+def next_link(headers):
+    # pulls the rel="next" url out of a Link header, None on the last page
+    for part in headers.get('Link', '').split(','):
+        section = part.split(';')
+        if len(section) < 2:
+            continue
+        if any(param.strip() == 'rel="next"' for param in section[1:]):
+            return section[0].strip()[1:-1]
+    return None
+
+async def close():
+    global _session
+    if _session is not None and not _session.closed:
+        await _session.close()
+    _session = None
@@ -0,0 +1,104 @@
+import os
+import logs
+import github_http
+
+# "rest" polls /releases and /releases/tags/{tag} per repo, "graphql" fetches the releases of
+# graphql_chunk_size repos in a single query before each batch of checks
+release_backend = os.getenv('release_backend', 'rest')
+graphql_chunk_size = int(os.getenv('graphql_chunk_size', 25))
+GRAPHQL_URL = f'{github_http.API_URL}/graphql'
+# same as the first page of /releases, if the stored release isn't in here the watcher falls back to rest
+RELEASES_PER_REPO = 10
+log = logs.get_logger('githubwatcher.graphql')
+
+RELEASE_FIELDS = """
+fragment ReleaseFields on Release {
+  databaseId tagName name url isPrerelease isDraft publishedAt updatedAt
+  author { login url avatarUrl }
+}
+"""
+
+def enabled():
+    return release_backend == 'graphql'
+
+def wants_releases(watcher):
+    return "ReleaseEvent" in watcher.tracked_events and not watcher.webhook
+
+def wants_tag(watcher):
+    return "TaggedReleaseEvent" in watcher.tracked_events and bool(watcher.tag_name)
+
+def build_query(watchers):
+    # one aliased repository() block per watcher, everything user supplied goes in as variables
+    params = []
+    blocks = []
+    variables = {}
+    for i, watcher in enumerate(watchers):
+        owner, name = watcher.name.split('/', 1)
+        params += [f"$o{i}: String!", f"$n{i}: String!"]
+        variables[f"o{i}"] = owner
+        variables[f"n{i}"] = name
+        fields = []
+        if wants_releases(watcher):
+            fields.append(f"releases(first: {RELEASES_PER_REPO}, orderBy: {{field: CREATED_AT, direction: DESC}}) {{ nodes {{ ...ReleaseFields }} }}")
+        if wants_tag(watcher):
+            params.append(f"$t{i}: String!")
+            variables[f"t{i}"] = watcher.tag_name
+            fields.append(f"release(tagName: $t{i}) {{ ...ReleaseFields releaseAssets(first: 100) {{ nodes {{ databaseId name size updatedAt downloadUrl }} }} }}")
+        blocks.append(f"r{i}: repository(owner: $o{i}, name: $n{i}) {{ {' '.join(fields)} }}")
+    query = f"query({', '.join(params)}) {{ {' '.join(blocks)} }}" + RELEASE_FIELDS
+    return query, variables
+
+def to_rest_release(node):
+    # reshapes a graphql Release into what the /releases api returns, so the embed code doesn't care
+    author = node.get('author')
+    release = {
+        'id': node['databaseId'],
+        'tag_name': node['tagName'],
+        'name': node['name'],
+        'html_url': node['url'],
+        'prerelease': node['isPrerelease'],
+        'draft': node['isDraft'],
+        'published_at': node['publishedAt'],
+        'updated_at': node['updatedAt'],
+        'author': {'login': author['login'], 'html_url': author['url'], 'avatar_url': author['avatarUrl']} if author else None,
+    }
+    if 'releaseAssets' in node:
+        release['assets'] = [{
+            'id': asset['databaseId'],
+            'name': asset['name'],
+            'size': asset['size'],
+            'updated_at': asset['updatedAt'],
+            'browser_download_url': asset['downloadUrl'],
+        } for asset in node['releaseAssets']['nodes']]
+    return release
+
+async def prefetch(watchers, headers):
+    # fills in watcher.prefetched_releases / watcher.prefetched_tag for every watcher that tracks
+    # releases, anything that fails is left as None and the watcher just uses rest for this check
+    watchers = [w for w in watchers if (wants_releases(w) or wants_tag(w)) and '/' in w.name]
+    for start in range(0, len(watchers), graphql_chunk_size):
+        chunk = watchers[start:start + graphql_chunk_size]
+        query, variables = build_query(chunk)
+        try:
+            response = await github_http.request('POST', GRAPHQL_URL, headers=headers, json={"query": query, "variables": variables})
+            if response.status != 200:
+                log.error("GraphQL release query failed - Status: %s", response.status)
+                continue
+            result = response.json()
+        except Exception as e:
+            log.error("Error in GraphQL release query: %s", e)
+            continue
+
+        data = result.get('data') or {}
+        if result.get('errors'):
+            log.warning("GraphQL release query returned %s errors, affected repos fall back to REST", len(result['errors']))
+        for i, watcher in enumerate(chunk):
+            repo = data.get(f"r{i}")
+            if not repo:
+                continue
+            if wants_releases(watcher) and repo.get('releases') is not None:
+                watcher.prefetched_releases = [to_rest_release(node) for node in repo['releases']['nodes'] if node]
+            if wants_tag(watcher):
+                # False = github says there is no release with that tag (the rest api's 404)
+                watcher.prefetched_tag = to_rest_release(repo['release']) if repo.get('release') else False
+        log.info("Fetched releases for %s repositories in one GraphQL query", len(chunk))
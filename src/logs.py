@@ -0,0 +1,114 @@
+import os
+import sys
+import json
+import queue
+import atexit
+import logging
+from datetime import datetime
+from logging.handlers import QueueHandler, QueueListener
+
+# DEBUG shows every request/event, INFO is roughly what the bot always printed
+log_level = os.getenv('log_level', 'INFO').upper()
+# "color" for a terminal, "plain" without the escape codes, "json" for one object per line
+log_format = os.getenv('log_format', 'color')
+
+HEADER = 21
+SUCCESS = 25
+logging.addLevelName(HEADER, 'HEADER')
+logging.addLevelName(SUCCESS, 'SUCCESS')
+
+class Colors:
+    RESET = '\033[0m'
+    BOLD = '\033[1m'
+    RED = '\033[91m'
+    GREEN = '\033[92m'
+    YELLOW = '\033[93m'
+    BLUE = '\033[94m'
+    MAGENTA = '\033[95m'
+    CYAN = '\033[96m'
+    WHITE = '\033[97m'
+    GRAY = '\033[90m'
+
+class BotLogger(logging.Logger):
+    # the two levels the old log() had on top of the usual ones
+    def header(self, msg, *args, **kwargs):
+        if self.isEnabledFor(HEADER):
+            self._log(HEADER, msg, args, **kwargs)
+
+    def success(self, msg, *args, **kwargs):
+        if self.isEnabledFor(SUCCESS):
+            self._log(SUCCESS, msg, args, **kwargs)
+
+logging.setLoggerClass(BotLogger)
+
+def get_logger(name='githubwatcher'):
+    return logging.getLogger(name)
+
+class ColorFormatter(logging.Formatter):
+    COLORS = {
+        logging.DEBUG: Colors.GRAY,
+        HEADER: Colors.CYAN + Colors.BOLD,
+        SUCCESS: Colors.GREEN,
+        logging.WARNING: Colors.YELLOW,
+        logging.ERROR: Colors.RED,
+        logging.CRITICAL: Colors.RED + Colors.BOLD,
+    }
+
+    def __init__(self, colored=True):
+        super().__init__()
+        self.colored = colored
+
+    def format(self, record):
+        timestamp = datetime.fromtimestamp(record.created).strftime("%Y-%m-%d %H:%M:%S")
+        message = record.getMessage()
+        if record.exc_info:
+            message += '\n' + self.formatException(record.exc_info)
+        color = self.COLORS.get(record.levelno) if self.colored else None
+        if color:
+            return f"{Colors.GRAY}{timestamp}{Colors.RESET} {color}{message}{Colors.RESET}"
+        if self.colored:
+            return f"{Colors.GRAY}{timestamp}{Colors.RESET} {message}"
+        return f"{timestamp} {record.levelname:7} {message}"
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {
+            "time": datetime.fromtimestamp(record.created).isoformat(timespec='milliseconds'),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage().strip(),
+        }
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry)
+
+class BackgroundQueueHandler(QueueHandler):
+    # the stock prepare() formats the message on the caller's thread, here the record goes into
+    # the queue as is and the listener thread does all the formatting and writing
+    def prepare(self, record):
+        return record
+
+listener = None
+
+def setup():
+    # everything under the "githubwatcher" logger goes through a queue to a writer thread,
+    # so logging never blocks the event loop on stdout
+    global listener
+    if listener is not None:
+        return
+    if log_format == 'json':
+        formatter = JsonFormatter()
+    else:
+        formatter = ColorFormatter(colored=log_format == 'color')
+    stream = logging.StreamHandler(sys.stdout)
+    stream.setFormatter(formatter)
+
+    log_queue = queue.SimpleQueue()
+    logger = get_logger()
+    logger.setLevel(log_level)
+    logger.addHandler(BackgroundQueueHandler(log_queue))
+    logger.propagate = False
+
+    listener = QueueListener(log_queue, stream)
+    listener.start()
+    atexit.register(listener.stop)
@@ -1,497 +1,1314 @@
 import discord
 import os
 import json
-import urllib3
-import traceback
-from datetime import datetime
+import asyncio
+import time
+import zlib
+import signal
+from array import array
+from types import MappingProxyType
 from dotenv import load_dotenv
-from uptime import keep_alive
-from discord.ext import commands, tasks
-from make_embed import MakeEmbed, MakeReleaseEmbed, MakeTaggedReleaseEmbed
-
-class Colors:
-    RESET = '\033[0m'
-    BOLD = '\033[1m'
-    RED = '\033[91m'
-    GREEN = '\033[92m'
-    YELLOW = '\033[93m'
-    BLUE = '\033[94m'
-    MAGENTA = '\033[95m'
-    CYAN = '\033[96m'
-    WHITE = '\033[97m'
-    GRAY = '\033[90m'
 
+# our modules read their settings from the environment at import time
 load_dotenv('variables.env')
+
+import logs
+logs.setup()
+log = logs.get_logger()
+
+import github_http
+import token_pool
+import shared_fetch
+import decode
+import digest
+import profiling
+from breaker import Breaker
+import metrics
+import sharding
+import org_feeds
+import graphql_releases
+import webhooks
+from scheduler import PollScheduler
+from seen_ids import SeenIds, RELEASE_SEEN_SIZE, seen_ids_size
+from state_store import StateStore, STATE_FILE
+from outbox import Outbox
+import uptime
+from discord import app_commands
+from discord.ext import commands, tasks
+from make_embed import MakeEmbed, MakeReleaseEmbed, MakeTaggedReleaseEmbed, renders
+
 loop_time = int(os.getenv('loop_time', 300))
+max_concurrency = int(os.getenv('max_concurrency', 10))
+poll_tick = int(os.getenv('poll_tick', 5))
+max_catchup_pages = int(os.getenv('max_catchup_pages', 10))
+# releases per /releases request, the first page is all a normal check needs
+releases_per_page = int(os.getenv('releases_per_page', 10))
 intents = discord.Intents.default()
 bot = commands.Bot(command_prefix='$', intents=intents)
-http = urllib3.PoolManager()
 allrepos = []
+# every repo in the config by key, with sharding allrepos only has the ones this instance polls
+repo_configs = {}
+# org name -> OrgFeed, the repos of these orgs get their events from the org feed instead of their own
+feeds = {}
+scheduler = PollScheduler()
+state_store = StateStore(STATE_FILE)
+shard = sharding.Shard(state_store.conn) if sharding.enabled() else None
 CONFIG_FILE = os.getenv('config_file', 'config.json')
+# seconds between checks of config.json for changes, 0 turns the file watching off (/reload still works)
+config_reload = int(os.getenv('config_reload', 30))
+config_mtime = None
+last_config_check = 0
+reload_pending = False
+started = False
+# held while a tick runs, so /reload doesn't swap watchers out from under a cycle
+repo_lock = asyncio.Lock()
+# the authorization header is added per request from the token pool. read only, every watcher
+# without validators for a url sends this one mapping as is
+GITHUB_HEADERS = MappingProxyType({
+    "Accept": "application/vnd.github+json"
+})
+# (etag, last-modified) of a url nothing has been fetched from yet
+NO_VALIDATORS = ("", "")
+RELEASE_EVENTS = frozenset(("ReleaseEvent", "TaggedReleaseEvent"))
+# tracked_events -> the frozensets watchers keep, most repos track the same few combinations so
+# 10k watchers share a handful of sets instead of holding a list each
+event_sets = {}
 
-def log(message, level="INFO"):
-    timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-    colored_timestamp = f"{Colors.GRAY}{timestamp}{Colors.RESET}"
-    
-    if level == "ERROR" or "Error" in message or "Failed" in message:
-        colored_message = f"{Colors.RED}{message}{Colors.RESET}"
-    elif level == "SUCCESS" or "Successfully" in message or "completed successfully" in message:
-        colored_message = f"{Colors.GREEN}{message}{Colors.RESET}"
-    elif level == "HEADER" or message.startswith("Starting") or message.startswith("Loading") or message.startswith("Initializing") or message.startswith("Checking"):
-        colored_message = f"{Colors.CYAN}{Colors.BOLD}{message}{Colors.RESET}"
-    elif "Rate limit" in message:
-        colored_message = f"{Colors.YELLOW}{message}{Colors.RESET}"
-    elif "Found new" in message or "Sent" in message:
-        colored_message = f"{Colors.GREEN}{message}{Colors.RESET}"
-    elif "Skipping" in message or "No new" in message or "304" in message:
-        colored_message = f"{Colors.GRAY}{message}{Colors.RESET}"
-    elif message.startswith("  ") and not message.startswith("    "):
-        colored_message = f"{Colors.RESET}{message}{Colors.RESET}"
-    else:
-        colored_message = message
-    
-    print(f"{colored_timestamp} {colored_message}")
+outbox = Outbox(bot.get_channel, bot.fetch_channel)
+metrics.outbox_depth.fn = outbox.depth
+metrics.events_sent.fn = lambda: outbox.sent
+metrics.events_failed.fn = lambda: outbox.failed
+metrics.breakers_open.fn = lambda: {(watcher.name, name): 1 for watcher in allrepos for name, _ in watcher.open_breakers()}
+
+def as_id(value):
+    # stored ids have been ints, strings and "" over time
+    return int(value) if value else 0
+
+def read_config():
+    with open(CONFIG_FILE, 'r') as f:
+        return json.load(f)
 
 def load_config():
     try:
-        with open(CONFIG_FILE, 'r') as f:
-            return json.load(f)
+        return read_config()
     except json.JSONDecodeError:
-        log("Error: Invalid JSON in config.json", "ERROR")
+        log.error("Error: Invalid JSON in config.json")
         return {"repositories": []}
     except FileNotFoundError:
-        log("Error: config.json not found", "ERROR")
+        log.error("Error: config.json not found")
         return {"repositories": []}
 
-def save_config(config):
-    with open(CONFIG_FILE, 'w') as f:
-        json.dump(config, f, indent=2)
+MISSING = object()
+
+def with_per_page(url, per_page):
+    if 'per_page=' in url:
+        return url
+    return f"{url}{'&' if '?' in url else '?'}per_page={per_page}"
+
+def event_set(events):
+    events = frozenset(events)
+    return event_sets.setdefault(events, events)
+
+class TrackedAssets:
+    # asset id -> signature of a tagged release, kept as two int64 arrays rather than a dict of int
+    # objects. releases have tens of assets so a linear lookup is fine. replaced, never changed in
+    # place, so the state dicts can hold the arrays without copying them
+    __slots__ = ('ids', 'signatures')
+    # stands for the signature of ids saved before signatures were kept, crc32 is never negative
+    UNKNOWN = -1
+
+    def __init__(self, ids=(), signatures=None):
+        self.ids = array('q', ids)
+        if signatures is None:
+            signatures = [self.UNKNOWN] * len(self.ids)
+        self.signatures = array('q', (self.UNKNOWN if signature is None else signature for signature in signatures))
+
+    def get(self, asset_id, default=None):
+        # the signature, None if it isn't known, default for an id that isn't tracked
+        try:
+            signature = self.signatures[self.ids.index(asset_id)]
+        except ValueError:
+            return default
+        return None if signature == self.UNKNOWN else signature
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __eq__(self, other):
+        return isinstance(other, TrackedAssets) and self.ids == other.ids and self.signatures == other.signatures
+
+def asset_signatures(assets):
+    # asset id -> crc of its updated_at and size, so an asset replaced in place still shows up as changed
+    return TrackedAssets([asset.id for asset in assets], [zlib.crc32(f"{asset.updated_at}|{asset.size}".encode()) for asset in assets])
+
+def repo_key(repo_config):
+    # the same repo can be in the config more than once (different threads/tags), so those are part of the key
+    name = repo_config.get('name') or github_http.repo_name_from_url(repo_config['url'])
+    key = name
+    if repo_config.get('thread_id'):
+        key += f"#{repo_config['thread_id']}"
+    if repo_config.get('tag_name'):
+        key += f"@{repo_config['tag_name']}"
+    return key
+
+def feed_for(repo_config):
+    for feed in feeds.values():
+        if feed.covers(repo_config):
+            return feed
+    return None
+
+def make_watcher(repo_config, state):
+    # saved state wins, the cursor fields in config.json only seed repos the state store hasn't seen yet
+    def pick(field, default):
+        return state.get(field, repo_config.get(field, default))
+
+    watcher = GithubWatcher(
+        repo_config['url'],
+        repo_config.get('name', ''),
+        pick('etag', ''),
+        pick('last_event_id', 0),
+        repo_config.get('tracked_events', []),
+        repo_config.get('releases_url', ''),
+        pick('releases_etag', ''),
+        pick('last_release_id', 0),
+        repo_config.get('tag_name', ''),
+        pick('tracked_asset_ids', []),
+        repo_config.get('thread_id', None),
+        pick('tag_etag', ''),
+        pick('tracked_asset_signatures', None),
+        pick('seen_event_ids', None),
+        pick('seen_event_floor', None),
+        pick('seen_release_ids', None),
+        pick('seen_release_floor', None)
+    )
+    watcher.key = repo_key(repo_config)
+    watcher.config = repo_config
+    watcher.feed = feed_for(repo_config)
+    watcher.webhook = bool(repo_config.get('webhook'))
+    watcher.digest_threshold = int(repo_config.get('digest_threshold', digest.digest_threshold))
+    if state:
+        watcher.saved_state = watcher.state()
+    return watcher
 
 @bot.event
 async def on_ready():
-    log(f'hello world {bot.user}', "HEADER")
-    
+    log.header('hello world %s', bot.user)
+    # on_ready fires again after every reconnect, the watchers are only set up once
+    global config_mtime, started
+    if started:
+        return
+    started = True
+
+    config_mtime = config_file_mtime()
     config = load_config()
-    log(f"Loading {len(config['repositories'])} repositories from config", "HEADER")
-    
+    log.header("Loading %s repositories from config", len(config['repositories']))
+    feeds.update(org_feeds.build_feeds(config))
     for repo_config in config['repositories']:
         if not repo_config or not repo_config.get('url'):
             continue
-            
-        watcher = GithubWatcher(
-            repo_config['url'], 
-            repo_config['name'],
-            repo_config.get('etag', ''),
-            repo_config.get('last_event_id', 0),
-            repo_config.get('tracked_events', []),
-            repo_config.get('releases_url', ''),
-            repo_config.get('releases_etag', ''),
-            repo_config.get('last_release_id', 0),
-            repo_config.get('tag_name', ''),
-            repo_config.get('tracked_asset_ids', []),
-            repo_config.get('thread_id', None)
-        )
+        repo_configs[repo_key(repo_config)] = repo_config
+
+    keys = list(repo_configs)
+    if shard:
+        shard.beat()
+        keys = sorted(shard.acquire([key for key in keys if shard.owns(key)]))
+        log.header("Shard %s: polling %s of %s repositories (%s instances)", shard.name, len(keys), len(repo_configs), len(shard.members))
+        shard_heartbeat.start()
+
+    saved_states = state_store.load_all()
+    for key in keys:
+        watcher = make_watcher(repo_configs[key], saved_states.get(key, {}))
         allrepos.append(watcher)
-        log(f"Added watcher for {watcher.name} - Tracking: {watcher.tracked_events}")
+        log.info("Added watcher for %s - Tracking: %s", watcher.name, sorted(watcher.tracked_events))
 
-    log("Initializing ETags and IDs for all repositories...", "HEADER")
-    for i in allrepos:
-        await i.set_etag_and_id()
+    log.header("Initializing ETags and IDs for all repositories...")
+    await bootstrap(allrepos)
 
-    await save_repositories_to_config()
-    log("Starting repository monitoring loop...", "HEADER")
+    save_repository_states(allrepos)
+    scheduler.stagger(allrepos)
+    log.header("Starting repository monitoring loop...")
     looprepos.start()
 
-async def save_repositories_to_config():
-    config = load_config()
-    
-    for i, repo in enumerate(allrepos):
-        if i < len(config['repositories']):
-            config['repositories'][i]['etag'] = repo.Headers.get("if-none-match", "")
-            config['repositories'][i]['last_event_id'] = repo.lastid
-            config['repositories'][i]['releases_etag'] = repo.releases_headers.get("if-none-match", "")
-            config['repositories'][i]['last_release_id'] = repo.last_release_id
-            if hasattr(repo, 'tag_name') and repo.tag_name:
-                config['repositories'][i]['tag_name'] = repo.tag_name
-            if hasattr(repo, 'tracked_asset_ids'):
-                config['repositories'][i]['tracked_asset_ids'] = repo.tracked_asset_ids
-    
-    save_config(config)
-    log("Saved repository states to config", "SUCCESS")
+@bot.event
+async def setup_hook():
+    try:
+        await uptime.keep_alive(handle_webhook)
+    except Exception as e:
+        log.error("Error starting the keep alive server on %s:%s: %s", uptime.http_host, uptime.http_port, e)
+    # kill -USR1 profiles the next profile_cycles cycles with cProfile, -USR2 with tracemalloc
+    try:
+        bot.loop.add_signal_handler(signal.SIGUSR1, profiling.start)
+        bot.loop.add_signal_handler(signal.SIGUSR2, lambda: profiling.start(cpu=False, memory=True))
+    except (NotImplementedError, AttributeError):
+        log.debug("Profiling signals aren't available on this platform")
+    try:
+        await bot.tree.sync()
+    except Exception as e:
+        log.error("Error syncing slash commands: %s", e)
+
+@bot.tree.command(name="reload", description="Pick up changes to the watched repositories in config.json")
+@app_commands.default_permissions(administrator=True)
+async def reload_command(interaction: discord.Interaction):
+    await interaction.response.defer(ephemeral=True)
+    async with repo_lock:
+        result = await reload_config()
+    if result is None:
+        await interaction.followup.send("config.json couldn't be read, nothing was changed", ephemeral=True)
+    else:
+        await interaction.followup.send("Reloaded: %s added, %s changed, %s removed, %s waiting on messages still being sent" % result, ephemeral=True)
+
+@bot.tree.command(name="profile", description="Profile the next few check cycles and write the report to disk")
+@app_commands.default_permissions(administrator=True)
+@app_commands.describe(cycles="How many cycles to profile", memory="Also trace memory allocations with tracemalloc")
+async def profile_command(interaction: discord.Interaction, cycles: app_commands.Range[int, 1, 100] = profiling.profile_cycles, memory: bool = False):
+    if profiling.start(cycles, memory=memory):
+        await interaction.response.send_message(f"Profiling the next {cycles} cycles, the report goes to {profiling.profile_dir}/", ephemeral=True)
+    else:
+        await interaction.response.send_message("A profile is already running", ephemeral=True)
+
+def config_file_mtime():
+    try:
+        return os.stat(CONFIG_FILE).st_mtime
+    except OSError:
+        return None
+
+def config_changed():
+    # a stat every config_reload seconds, the file is only read when its mtime moved
+    global config_mtime, last_config_check
+    if not config_reload or time.time() - last_config_check < config_reload:
+        return False
+    last_config_check = time.time()
+    mtime = config_file_mtime()
+    if mtime == config_mtime:
+        return False
+    config_mtime = mtime
+    return True
+
+async def reload_config():
+    # diffs config.json against the running watchers: new repos are added and initialised, removed
+    # ones stop, changed ones are rebuilt from their in memory cursors/etags, everything else is left
+    # alone. a removed or changed repo with embeds still queued is left until they're sent, the
+    # next tick tries again. returns (added, changed, removed, waiting), None if the file is broken
+    global reload_pending
+    try:
+        config = read_config()
+    except Exception as e:
+        log.error("Error reloading %s, keeping the running config: %s", CONFIG_FILE, e)
+        return None
+
+    desired = {}
+    for repo_config in config.get('repositories', []):
+        if repo_config and repo_config.get('url'):
+            desired[repo_key(repo_config)] = repo_config
+    repo_configs.clear()
+    repo_configs.update(desired)
+    new_feeds = org_feeds.build_feeds(config, feeds)
+    feeds.clear()
+    feeds.update(new_feeds)
+    for watcher in allrepos:
+        watcher.feed = feed_for(watcher.config)
+
+    current = {watcher.key: watcher for watcher in allrepos}
+    removed, changed, waiting = [], [], 0
+    for key, watcher in current.items():
+        if key in desired and watcher.config == desired[key]:
+            continue
+        if watcher.state() != watcher.live_state():
+            waiting += 1
+            continue
+        drop_watcher(watcher)
+        if key in desired:
+            changed.append(make_watcher(desired[key], watcher.state()))
+            changed[-1].saved_state = watcher.saved_state
+        else:
+            removed.append(watcher)
+            state_store.delete(key)
+    if shard:
+        shard.release([watcher.key for watcher in removed])
+
+    allrepos.extend(changed)
+    added = []
+    if shard:
+        # new repos are picked up by whichever instance the ring gives them to
+        await rebalance()
+    else:
+        added = [make_watcher(desired[key], state_store.load(key) or {}) for key in desired if key not in current]
+        allrepos.extend(added)
+
+    await bootstrap(changed + added)
+    save_repository_states(changed + added)
+    scheduler.stagger(changed + added, poll_tick * 2)
+
+    reload_pending = waiting > 0
+    log.header("Reloaded %s: %s added, %s changed, %s removed, %s waiting on messages still being sent",
+               CONFIG_FILE, len(added), len(changed), len(removed), waiting)
+    return len(added), len(changed), len(removed), waiting
+
+async def bootstrap(watchers):
+    # repos with saved cursors start without a request, the rest are initialised max_concurrency
+    # at a time so startup doesn't grow with the number of new repos one round trip at a time
+    semaphore = asyncio.Semaphore(max_concurrency)
+    async def start(watcher):
+        async with semaphore:
+            await watcher.set_etag_and_id()
+    await asyncio.gather(*(start(watcher) for watcher in watchers))
 
-@tasks.loop(seconds=loop_time)
+def save_repository_states(watchers):
+    # only repos whose state changed since the last save get written
+    changed = {}
+    for watcher in watchers:
+        state = watcher.state()
+        if state != watcher.saved_state:
+            changed[watcher.key] = state
+            watcher.saved_state = state
+
+    if changed:
+        # one transaction for all of them, so it's timed under "*" rather than per repo
+        with profiling.timed('persist', '*'):
+            state_store.save(changed)
+        log.success("Saved %s repository states", len(changed))
+
+def drop_watcher(watcher):
+    # stops polling a repo, whatever is in the state store for it stays there
+    watcher.active = False
+    scheduler.remove(watcher)
+    for url in watcher.endpoints():
+        shared_fetch.fetcher.unsubscribe(url)
+    allrepos.remove(watcher)
+
+@tasks.loop(seconds=sharding.shard_heartbeat)
+async def shard_heartbeat():
+    # separate from looprepos so a long cycle can't make this instance look dead to the others
+    try:
+        if shard.beat():
+            log.header("Shard %s: %s instances running (%s)", shard.name, len(shard.members), ', '.join(shard.members))
+        shard.acquire([watcher.key for watcher in allrepos])
+    except Exception as e:
+        log.error("Error sending shard heartbeat: %s", e)
+
+async def rebalance():
+    # hands repos the ring moved to another instance over once everything queued for them is sent,
+    # and picks up the ones that moved here once their old owner let go
+    shard.last_rebalance = time.time()
+    current = {watcher.key: watcher for watcher in allrepos}
+    wanted = {key for key in repo_configs if shard.owns(key)}
+
+    handed_over = [watcher for key, watcher in current.items() if key not in wanted and watcher.state() == watcher.live_state()]
+    save_repository_states(handed_over)
+    for watcher in handed_over:
+        drop_watcher(watcher)
+        del current[watcher.key]
+    shard.release([watcher.key for watcher in handed_over])
+
+    held = shard.acquire(wanted | set(current))
+    for key, watcher in list(current.items()):
+        if key not in held:
+            # our lease ran out and another instance has the repo now, its state is newer than ours
+            log.warning("Shard %s: lost the lease on %s", shard.name, watcher.name)
+            drop_watcher(watcher)
+            del current[key]
+
+    picked_up = []
+    for key in sorted(held - set(current)):
+        watcher = make_watcher(repo_configs[key], state_store.load(key) or {})
+        allrepos.append(watcher)
+        picked_up.append(watcher)
+    await bootstrap(picked_up)
+    save_repository_states(picked_up)
+    scheduler.stagger(picked_up)
+
+    if handed_over or picked_up:
+        log.header("Shard %s: handed over %s and picked up %s repositories, polling %s", shard.name, len(handed_over), len(picked_up), len(allrepos))
+
+async def poll_feeds():
+    # one request per org feed, its events are handed to the watchers of the repos they belong to
+    for feed in feeds.values():
+        watchers = [watcher for watcher in allrepos if watcher.feed is feed]
+        if not watchers or not feed.due():
+            continue
+        try:
+            cursors = [as_id(watcher.lastid) for watcher in watchers if as_id(watcher.lastid)]
+            events = await feed.poll(GITHUB_HEADERS, min(cursors) if cursors else 0)
+            # repos whose own events request at startup failed or came back empty (nothing public in
+            # github's 90 days) would otherwise ignore the feed until a restart
+            for watcher in watchers:
+                if not watcher.seen_events and feed.last_id:
+                    watcher.start_from_feed(feed.last_id)
+            if not events:
+                continue
+            by_repo = {}
+            for event in events:
+                by_repo.setdefault(event['repo']['name'].lower(), []).append(event)
+            log.debug("Feed %s: %s new events for %s repositories", feed.org, len(events), len(by_repo))
+            for watcher in watchers:
+                repo_events = by_repo.get(watcher.name.lower())
+                if repo_events:
+                    watcher.handle_feed_events(repo_events)
+        except Exception as e:
+            log.error("Error polling feed %s: %s", feed.org, e)
+
+recent_deliveries = webhooks.RecentDeliveries()
+
+def handle_webhook(event_name, delivery_id, payload):
+    # a verified webhook delivery, goes to the webhook backed watchers of its repo.
+    # returns False until the watchers are set up, so github retries it later. redeliveries and
+    # events/actions there is nothing to show for are accepted (True) and dropped
+    if not looprepos.is_running():
+        return False
+    try:
+        if not recent_deliveries.first_time(delivery_id):
+            log.debug("Webhook: delivery %s was already handled", delivery_id)
+            return True
+        event = webhooks.to_event(event_name, delivery_id, payload)
+        if event is None or not renders(event['type'], event['payload'].get('action')):
+            log.debug("Webhook: ignoring %s delivery %s (action: %s)", event_name, delivery_id, payload.get('action'))
+            return True
+        repo_name = event['repo']['name'].lower()
+        watchers = [watcher for watcher in allrepos if watcher.webhook and watcher.name.lower() == repo_name]
+        log.debug("Webhook: %s delivery %s for %s (%s watchers)", event_name, delivery_id, repo_name, len(watchers))
+        for watcher in watchers:
+            watcher.handle_webhook(event)
+    except Exception as e:
+        log.exception("Error handling webhook delivery %s: %s", delivery_id, e)
+    return True
+
+async def check_repo(watcher, semaphore):
+    async with semaphore:
+        log.debug("Checking %s...", watcher.name)
+        watcher.found_new = False
+        await watcher.check_github()
+        watcher.prefetched_releases = watcher.prefetched_tag = None
+        watcher.idle_streak = 0 if watcher.found_new else watcher.idle_streak + 1
+
+async def run_cycle(watchers):
+    # repos are checked concurrently, the semaphore caps how many requests are in flight at once
+    semaphore = asyncio.Semaphore(max_concurrency)
+    results = await asyncio.gather(*(check_repo(i, semaphore) for i in watchers), return_exceptions=True)
+    for watcher, result in zip(watchers, results):
+        if isinstance(result, Exception):
+            log.error("Error checking %s: %s", watcher.name, result)
+
+@tasks.loop(seconds=poll_tick)
 async def looprepos():
-    global allrepos
-    log(f"cycle loop is a go for {len(allrepos)} repositories...", "HEADER")
+    async with repo_lock:
+        await run_tick()
 
+async def run_tick():
+    # every repo has its own due time in the scheduler (entries of the same repo share one), each
+    # tick checks whichever ones are due
+    if reload_pending or config_changed():
+        try:
+            await reload_config()
+        except Exception as e:
+            log.exception("Error reloading config: %s", e)
+    if shard and shard.rebalance_due():
+        try:
+            await rebalance()
+        except Exception as e:
+            log.exception("Error rebalancing shards: %s", e)
+    if feeds:
+        await poll_feeds()
+    due = scheduler.pop_due()
+    if not due:
+        metrics.tick_finished()
+        return
+
+    log.header("cycle loop is a go for %s of %s repositories...", len(due), len(allrepos))
+    state = token_pool.pool.state()
+    if state["remaining"] is not None:
+        log.info("Rate limit remaining: %s/%s over %s tokens (resets in %ss)", state['remaining'], state['limit'], state['tokens'], state['reset_in'])
+    backing_off = [watcher.name for watcher in due if watcher.open_breakers()]
+    if backing_off:
+        log.warning("%s repositories are backing off after failures: %s", len(backing_off), ', '.join(backing_off[:10]) + (' ...' if len(backing_off) > 10 else ''))
+
+    start = time.perf_counter()
+    profiling.cycle_started()
     try:
-        for i in allrepos:
-            log(f"Checking {i.name}...")
-            await i.check_github()
-        
-        await save_repositories_to_config()
-        log("Check cycle completed successfully", "SUCCESS")
+        if graphql_releases.enabled():
+            await graphql_releases.prefetch(due, GITHUB_HEADERS)
+        await run_cycle(due)
+        save_repository_states(due)
+        metrics.cycle_finished(time.perf_counter() - start, len(due))
+        log.success("Check cycle completed successfully")
         
     except Exception as e:
-        log(f"Error in loop cycle: {e}", "ERROR")
-        traceback.print_exc()
+        log.exception("Error in loop cycle: %s", e)
+
+    finally:
+        profiling.cycle_finished()
+        for watcher in due:
+            scheduler.reschedule(watcher)
+        metrics.tick_finished()
 
 class GithubWatcher:
-    def __init__(self, events_url: str, name: str = "", etag: str = "", last_event_id: int = 0, tracked_events: list = None, releases_url: str = "", releases_etag: str = "", last_release_id: int = 0, tag_name: str = "", tracked_asset_ids: list = None, thread_id: int = None):
+    # slots, and no per watcher copies of things they can share, so 10k+ repos fit in one process
+    # (bench/bench_memory.py)
+    __slots__ = ('url', 'releases_url', 'name', 'lastid', 'last_release_id', 'seen_events', 'seen_releases',
+                 'tracked_events', 'other_events', 'tag_name', 'tag_url', 'tracked_assets', 'validators',
+                 'thread_id', 'poll_interval', 'idle_streak', 'found_new', 'prefetched_releases',
+                 'prefetched_tag', 'key', 'saved_state', 'feed', 'webhook', 'digest_threshold', 'active',
+                 'repo_breaker', 'breakers', 'committed', 'config')
+
+    def __init__(self, events_url: str, name: str = "", etag: str = "", last_event_id: int = 0, tracked_events: list = None, releases_url: str = "", releases_etag: str = "", last_release_id: int = 0, tag_name: str = "", tracked_asset_ids: list = None, thread_id: int = None, tag_etag: str = "", tracked_asset_signatures: list = None, seen_event_ids: list = None, seen_event_floor: int = None, seen_release_ids: list = None, seen_release_floor: int = None):
         self.url = events_url
-        self.releases_url = releases_url or events_url.replace('/events', '/releases')
-        self.name = name or events_url[29:].replace('/events', '')
-        self.Headers = {
-            "if-none-match": etag,
-            "authorization": f"token {os.getenv('git_token')}", 
-            "Accept": "application/vnd.github+json"
-        }
-        self.releases_headers = {
-            "if-none-match": releases_etag,
-            "authorization": f"token {os.getenv('git_token')}", 
-            "Accept": "application/vnd.github+json"
-        }
+        self.releases_url = with_per_page(releases_url or events_url.replace('/events', '/releases'), releases_per_page)
+        self.name = name or github_http.repo_name_from_url(events_url)
         self.lastid = last_event_id
         self.last_release_id = last_release_id
-        self.tracked_events = tracked_events or []
+        # ids already handled, state saved before these were kept only has the last ids so those become the floor
+        if seen_event_floor is None:
+            seen_event_floor = 0 if seen_event_ids else as_id(last_event_id)
+        if seen_release_floor is None:
+            seen_release_floor = 0 if seen_release_ids else as_id(last_release_id)
+        self.seen_events = SeenIds(seen_event_ids or (), seen_event_floor)
+        self.seen_releases = SeenIds(seen_release_ids or (), seen_release_floor, size=RELEASE_SEEN_SIZE)
+        self.tracked_events = event_set(tracked_events or ())
+        # the tracked events that come from the events endpoint/org feed/webhooks
+        self.other_events = event_set(self.tracked_events - RELEASE_EVENTS)
         self.tag_name = tag_name
-        self.tracked_asset_ids = tracked_asset_ids or []
+        self.tag_url = f"{github_http.API_URL}/repos/{self.name}/releases/tags/{tag_name}" if tag_name else ""
+        # asset id -> signature of its updated_at/size, None for ids saved before signatures were kept
+        self.tracked_assets = TrackedAssets(tracked_asset_ids or (), tracked_asset_signatures)
+        # (etag, last-modified) per endpoint url, so every endpoint gets its own conditional requests
+        self.validators = {}
+        self.set_etag(self.url, etag)
+        self.set_etag(self.releases_url, releases_etag)
+        self.set_etag(self.tag_url, tag_etag)
         self.thread_id = thread_id
-        log(f"Created watcher for {self.name} - Events: {self.lastid}, Releases: {self.last_release_id}")
+        # read by the scheduler to work out the next check
+        self.poll_interval = 0
+        self.idle_streak = 1
+        self.found_new = False
+        # filled in by graphql_releases before a check when release_backend is graphql
+        self.prefetched_releases = None
+        self.prefetched_tag = None
+        # set by make_watcher, saved_state is what the state store last got for this repo
+        self.key = self.name
+        self.saved_state = None
+        # set when an org feed brings this repo's events, then the events url isn't polled
+        self.feed = None
+        # set for repos with "webhook": true, their events and releases come from webhook deliveries
+        self.webhook = False
+        # bursts at least this big are merged into digest embeds, 0 = off
+        self.digest_threshold = digest.digest_threshold
+        # cleared by drop_watcher, a stopped watcher doesn't write to the state store anymore
+        self.active = True
+        # the repo breaker opens when the repo is gone (404/410/451), the per url ones when an endpoint keeps failing
+        self.repo_breaker = Breaker()
+        self.breakers = {}
+        for url in self.endpoints():
+            shared_fetch.fetcher.subscribe(url)
+        # the state that has actually been delivered to discord, this is what gets saved (see deliver)
+        self.committed = self.live_state()
+        log.info("Created watcher for %s - Events: %s, Releases: %s", self.name, self.lastid, self.last_release_id)
         if self.tag_name:
-            log(f"  {self.name}: Tracking tag '{self.tag_name}' with {len(self.tracked_asset_ids)} assets")
+            log.info("  %s: Tracking tag '%s' with %s assets", self.name, self.tag_name, len(self.tracked_assets))
         if self.thread_id:
-            log(f"  {self.name}: Will post to thread {self.thread_id}")
+            log.info("  %s: Will post to thread %s", self.name, self.thread_id)
     
-    def validate_last_id_exists(self, last_id, data):
-        if last_id == 0:
-            log(f"  {self.name}: No stored ID to validate (starting fresh)")
-            return False
-        for item in data:
-            if str(item['id']) == str(last_id):
-                log(f"  {self.name}: Found stored ID {last_id} in current data")
-                return True
-        log(f"  {self.name}: Stored ID {last_id} NOT found in current data - will reset")
-        return False
+    def channel_id(self):
+        return self.thread_id or int(os.getenv('channel_id'))
+
+    def endpoints(self):
+        # the urls this watcher polls, used to share requests with watchers of the same repo
+        urls = [self.url] if self.other_events or not self.tracked_events else []
+        if "ReleaseEvent" in self.tracked_events:
+            urls.append(self.releases_url)
+        if "TaggedReleaseEvent" in self.tracked_events and self.tag_url:
+            urls.append(self.tag_url)
+        return urls
+
+    def state(self):
+        return dict(self.committed)
+
+    def live_state(self):
+        return {
+            "etag": self.etag_for(self.url),
+            "last_event_id": self.lastid,
+            "releases_etag": self.etag_for(self.releases_url),
+            "last_release_id": self.last_release_id,
+            "tag_etag": self.etag_for(self.tag_url),
+            "tracked_asset_ids": self.tracked_assets.ids,
+            "tracked_asset_signatures": self.tracked_assets.signatures,
+            **self.seen_state("event"),
+            **self.seen_state("release"),
+        }
+
+    def seen_state(self, kind, seen=None):
+        # the seen ids of "event" or "release" for the state store, the live ones unless seen is given
+        if seen is None:
+            seen = self.seen_events if kind == "event" else self.seen_releases
+        ids, floor = seen.state()
+        return {f"seen_{kind}_ids": ids, f"seen_{kind}_floor": floor}
+
+    def mark_seen(self, kind, item_ids):
+        # adds ids to the live seen index of "event" or "release", returns the cursor field that
+        # commits just these ids once whatever they produced has been sent
+        item_ids = list(item_ids)
+        (self.seen_events if kind == "event" else self.seen_releases).update(item_ids)
+        return {f"seen_{kind}_added": item_ids}
+
+    def set_etag(self, url, etag):
+        if url and etag:
+            self.validators[url] = (etag, "")
+
+    def etag_for(self, url):
+        return self.validators.get(url, NO_VALIDATORS)[0]
+
+    def headers_for(self, url):
+        etag, last_modified = self.validators.get(url, NO_VALIDATORS)
+        if not etag and not last_modified:
+            return GITHUB_HEADERS
+        headers = dict(GITHUB_HEADERS)
+        if etag:
+            headers["if-none-match"] = etag
+        if last_modified:
+            headers["if-modified-since"] = last_modified
+        return headers
+
+    def remember_validators(self, url, response):
+        self.validators[url] = (response.headers.get("ETag") or "", response.headers.get("Last-Modified") or "")
+
+    def endpoint_name(self, url):
+        if url == self.url:
+            return "events"
+        if url == self.releases_url:
+            return "releases"
+        return "tag"
+
+    def breaker_for(self, url):
+        breaker = self.breakers.get(url)
+        if breaker is None:
+            breaker = self.breakers[url] = Breaker()
+        return breaker
+
+    def can_fetch(self, url):
+        return self.repo_breaker.allows() and (url not in self.breakers or self.breakers[url].allows())
+
+    def open_breakers(self):
+        # (endpoint, reason) for every open breaker, for the logs and metrics
+        breakers = [("repo", self.repo_breaker)] + [(self.endpoint_name(url), breaker) for url, breaker in self.breakers.items()]
+        return [(name, breaker.reason) for name, breaker in breakers if breaker.is_open()]
+
+    async def fetch(self, url):
+        # a conditional GET through the shared fetcher, guarded by the breakers. returns None when
+        # the request was skipped or failed, or the repo turned out to be renamed (the next check
+        # uses the new urls), otherwise the response for the caller to handle as usual
+        if not self.can_fetch(url):
+            log.debug("    %s: Skipping %s, its breaker is open until the backoff runs out", self.name, self.endpoint_name(url))
+            return None
+        try:
+            response = await shared_fetch.fetcher.fetch(url, self.headers_for(url))
+        except Exception as e:
+            reason = f"{type(e).__name__}: {e}" if str(e) else type(e).__name__
+            log.error("    %s: %s request failed (%s)", self.name, self.endpoint_name(url), reason)
+            self.failed(url, reason)
+            return None
+
+        status = response.status
+        if status in (301, 302, 307, 308):
+            await self.follow_rename(url, response)
+            return None
+        if status in (200, 304) or (status == 404 and url == self.tag_url):
+            # a missing tag just hasn't been created yet
+            self.recovered(url, status)
+        elif status in (404, 410, 451):
+            self.failed(url, f"status {status}", repo=True)
+        elif status >= 500 or (status == 403 and "Retry-After" not in response.headers and response.headers.get("X-RateLimit-Remaining") != "0"):
+            # 403s from the rate limits are the budget's business, not a broken endpoint
+            self.failed(url, f"status {status}")
+        return response
+
+    def recovered(self, url, status):
+        # the tag endpoint answering says nothing about the repo, the events/releases ones do
+        breakers = [(self.endpoint_name(url), self.breakers.get(url))]
+        if url != self.tag_url:
+            breakers.append(("repository", self.repo_breaker))
+        for name, breaker in breakers:
+            if breaker is not None and breaker.success():
+                metrics.breaker_recoveries.inc()
+                log.success("    %s: %s is back (%s)", self.name, name, status)
+
+    def failed(self, url, reason, repo=False):
+        # repo: the repo itself looks gone (deleted, private, blocked), so the repo breaker counts it too
+        breakers = [(self.endpoint_name(url), self.breaker_for(url))]
+        if repo:
+            breakers.append(("repository", self.repo_breaker))
+        for name, breaker in breakers:
+            delay = breaker.failure(reason)
+            if delay:
+                metrics.breaker_trips.inc()
+                log.warning("    %s: %s failed %s times in a row (%s), backing off for %ss", self.name, name, breaker.failures, reason, round(delay, 1))
+
+    async def follow_rename(self, url, response):
+        # a renamed or transferred repo answers with a 301 to /repositories/{id}/..., the repo's
+        # new name comes from /repositories/{id} and every url of the watcher is moved over to it
+        location = response.headers.get("Location", "")
+        repo_id = location.split('/repositories/', 1)[1].split('/', 1)[0] if '/repositories/' in location else ''
+        try:
+            if not repo_id:
+                raise ValueError(f"unexpected Location {location!r}")
+            repo = await github_http.request('GET', f"{github_http.API_URL}/repositories/{repo_id}", headers=GITHUB_HEADERS, label=self.name)
+            if repo.status != 200:
+                raise ValueError(f"status {repo.status} looking up repository {repo_id}")
+            new_name = repo.json()['full_name']
+        except Exception as e:
+            self.failed(url, f"redirect {response.status} that couldn't be followed: {e}", repo=True)
+            return
+        if new_name.lower() == self.name.lower():
+            self.failed(url, f"redirect {response.status} to {location}")
+            return
+        self.rename(new_name)
+
+    def rename(self, new_name):
+        old_name = self.name
+        for url in self.endpoints():
+            shared_fetch.fetcher.unsubscribe(url)
+        moved = {}
+        for attr in ("url", "releases_url", "tag_url"):
+            old_url = getattr(self, attr)
+            new_url = old_url.replace(f"/repos/{old_name}/", f"/repos/{new_name}/")
+            setattr(self, attr, new_url)
+            moved[old_url] = new_url
+        # the etags belonged to the old urls, they're kept so the new ones start with a 304 if nothing changed
+        self.validators = {moved.get(url, url): validators for url, validators in self.validators.items()}
+        self.breakers = {}
+        self.name = new_name
+        for url in self.endpoints():
+            shared_fetch.fetcher.subscribe(url)
+        log.warning("    %s: Repository was renamed to %s, now polling the new name. Update its url in config.json", old_name, new_name)
+
+    def deliver(self, channel_id, embeds, cursor):
+        # hands the embeds to the outbox, the cursor that produced them (seen ids included) is only
+        # committed once the last one is sent, so a crash before that means they get picked up again.
+        # once sent it's written to the state store straight away instead of at the end of the
+        # tick, so a crash after sending can't post them twice. a cursor without embeds still waits
+        # behind whatever this channel has queued, it can't get ahead of what was actually posted
+        if not embeds:
+            if outbox.pending(channel_id):
+                outbox.after(channel_id, lambda: self.commit(cursor))
+            else:
+                self.apply(cursor)
+            return
+        metrics.events_found.inc(amount=len(embeds))
+        for embed in embeds[:-1]:
+            outbox.send(channel_id, embed)
+        outbox.send(channel_id, embeds[-1], lambda: self.commit(cursor))
+
+    def apply(self, cursor):
+        # a cursor only has the seen ids its own check added, they're merged into the committed ones,
+        # so committing it can't mark ids as seen that another check still has waiting to be sent
+        for kind, size in (("event", seen_ids_size), ("release", RELEASE_SEEN_SIZE)):
+            added = cursor.get(f"seen_{kind}_added")
+            if added:
+                seen = SeenIds(self.committed[f"seen_{kind}_ids"], self.committed[f"seen_{kind}_floor"], size)
+                seen.update(added)
+                self.committed.update(self.seen_state(kind, seen))
+        self.committed.update((field, value) for field, value in cursor.items() if not field.endswith("_added"))
+
+    def commit(self, cursor):
+        self.apply(cursor)
+        if not self.active:
+            return
+        state = self.state()
+        try:
+            with profiling.timed('persist', self.name):
+                state_store.save({self.key: state})
+            self.saved_state = state
+        except Exception as e:
+            log.error("    %s: Error saving state after sending: %s", self.name, e)
+
+    async def collect_new(self, response, data, seen):
+        # picks the items that aren't in seen off each page, walking the Link: rel="next" pages
+        # until one has an item that was seen before or it runs out of pages. a page can be out of
+        # order or repeat items of the one before it, so every item is looked up instead of stopping
+        # at the first old one. returns the new items newest first and whether a seen item was reached
+        new_items = []
+        picked = set()
+        pages = 1
+        while True:
+            reached = False
+            with profiling.timed('diff', self.name):
+                for item in data:
+                    item_id = as_id(item['id'])
+                    if item_id in seen:
+                        reached = True
+                    elif item_id not in picked:
+                        picked.add(item_id)
+                        new_items.append(item)
+            if reached:
+                break
+
+            next_url = github_http.next_link(response.headers)
+            if not next_url or pages >= max_catchup_pages:
+                break
+            token = github_http.token_for(self.url)
+            if not token.budget.allows(borrow=True):
+                log.warning("    %s: Rate limit budget spent - stopping catch up after %s pages", self.name, pages)
+                break
+
+            pages += 1
+            log.debug("    %s: No seen ID on page %s yet, fetching page %s...", self.name, pages - 1, pages)
+            # follow-up pages are plain requests, the validators only belong to the first page
+            # next links point at /repositories/{id}/..., so say which repo and token they belong to
+            response = await github_http.request('GET', next_url, headers=GITHUB_HEADERS, token=token, label=self.name)
+            if response.status != 200:
+                log.error("    %s: Catch up page %s failed - Status: %s", self.name, pages, response.status)
+                break
+            with profiling.timed('decode', self.name):
+                data = response.json()
+            if not data:
+                break
+        new_items.sort(key=lambda item: as_id(item['id']), reverse=True)
+        return new_items, reached
 
     async def set_etag_and_id(self):
-        log(f"Initializing {self.name}...")
+        log.info("Initializing %s...", self.name)
         
-        # initialise events if needed
-        if self.lastid == 0 or not self.Headers.get("if-none-match"):
-            log(f"  {self.name}: Initializing events (lastid={self.lastid}, etag={bool(self.Headers.get('if-none-match'))})")
+        # initialise events if needed. repos on an org feed too: the feed skips repos without a seen
+        # index, so on a first start their own events url is requested once to seed it (if that
+        # fails or has no events, poll_feeds starts them from the feed instead)
+        if self.webhook:
+            log.info("  %s: Events and releases come from webhooks, skipping their initialization", self.name)
+        # a saved seen index is enough to start from, without an etag the first check is just a full 200
+        elif not self.seen_events:
+            log.info("  %s: Initializing events (lastid=%s, etag=%s)", self.name, self.lastid, bool(self.etag_for(self.url)))
             await self.initialize_events()
         else:
-            log(f"  {self.name}: Using saved event state (lastid={self.lastid})")
+            log.info("  %s: Using saved event state (lastid=%s)", self.name, self.lastid)
         
         # initialise releases if release event is tracked
-        if "ReleaseEvent" in self.tracked_events:
-            if self.last_release_id == 0 or not self.releases_headers.get("if-none-match"):
-                log(f"  {self.name}: Initializing releases (last_release_id={self.last_release_id}, etag={bool(self.releases_headers.get('if-none-match'))})")
+        if "ReleaseEvent" in self.tracked_events and not self.webhook:
+            if not self.seen_releases:
+                log.info("  %s: Initializing releases (last_release_id=%s, etag=%s)", self.name, self.last_release_id, bool(self.etag_for(self.releases_url)))
                 await self.initialize_releases()
             else:
-                log(f"  {self.name}: Using saved release state (last_release_id={self.last_release_id})")
-        else:
-            log(f"  {self.name}: ReleaseEvent not tracked, skipping release initialization")
+                log.info("  %s: Using saved release state (last_release_id=%s)", self.name, self.last_release_id)
+        elif not self.webhook:
+            log.info("  %s: ReleaseEvent not tracked, skipping release initialization", self.name)
             
         # initialize tagged release if tracked
         if "TaggedReleaseEvent" in self.tracked_events and self.tag_name:
-            if not self.tracked_asset_ids:
-                log(f"  {self.name}: Initializing tagged release assets for tag '{self.tag_name}'")
+            if not self.tracked_assets:
+                log.info("  %s: Initializing tagged release assets for tag '%s'", self.name, self.tag_name)
                 await self.initialize_tagged_release()
             else:
-                log(f"  {self.name}: Using saved tagged release state ({len(self.tracked_asset_ids)} assets for tag '{self.tag_name}')")
+                log.info("  %s: Using saved tagged release state (%s assets for tag '%s')", self.name, len(self.tracked_assets), self.tag_name)
+
+        # nothing is sent while initialising, so all of it counts as delivered
+        self.committed = self.live_state()
 
     async def initialize_events(self):
         try:
-            log(f"  {self.name}: Making API request to {self.url}")
-            url = http.request('GET', url=self.url, headers=self.Headers, timeout=30)
-            log(f"  {self.name}: Events API response: {url.status}")
+            log.debug("  %s: Making API request to %s", self.name, self.url)
+            url = await self.fetch(self.url)
+            if url is None:
+                return
+            log.debug("  %s: Events API response: %s", self.name, url.status)
+            self.poll_interval = int(url.headers.get("X-Poll-Interval", self.poll_interval))
             
-            if url.status == 200 and url.data:
-                data = json.loads(url.data)
+            if url.status == 200:
+                data = url.json()
                 if data:
-                    self.Headers["if-none-match"] = url.headers.get("ETag", "")
-                    self.lastid = str(data[0]['id'])
-                    log(f'  {self.name}: Events initialized - LastID={self.lastid}', "SUCCESS")
+                    self.remember_validators(self.url, url)
+                    self.seen_events.update(as_id(event['id']) for event in data)
+                    self.lastid = str(max(as_id(event['id']) for event in data))
+                    log.success('  %s: Events initialized - LastID=%s', self.name, self.lastid)
                 else:
-                    log(f"  {self.name}: Empty events data received")
+                    log.info("  %s: Empty events data received", self.name)
             else:
-                log(f"  {self.name}: Failed to initialize events - Status: {url.status}", "ERROR")
+                log.error("  %s: Failed to initialize events - Status: %s", self.name, url.status)
         except Exception as e:
-            log(f"  {self.name}: Error initializing events: {e}", "ERROR")
+            log.error("  %s: Error initializing events: %s", self.name, e)
 
     async def initialize_releases(self):
         try:
-            log(f"  {self.name}: Making API request to {self.releases_url}")
-            url = http.request('GET', url=self.releases_url, headers=self.releases_headers, timeout=30)
-            log(f"  {self.name}: Releases API response: {url.status}")
+            log.debug("  %s: Making API request to %s", self.name, self.releases_url)
+            url = await self.fetch(self.releases_url)
+            if url is None:
+                return
+            log.debug("  %s: Releases API response: %s", self.name, url.status)
             
-            if url.status == 200 and url.data:
-                data = json.loads(url.data)
+            if url.status == 200:
+                data = url.json()
                 if data:
-                    old_etag = self.releases_headers.get("if-none-match", "none")
-                    self.releases_headers["if-none-match"] = url.headers.get("ETag", "")
-                    self.last_release_id = data[0]['id']
-                    log(f'  {self.name}: Releases initialized - LastReleaseID={self.last_release_id}', "SUCCESS")
+                    self.remember_validators(self.releases_url, url)
+                    self.seen_releases.update(as_id(release['id']) for release in data)
+                    self.last_release_id = max(as_id(release['id']) for release in data)
+                    log.success('  %s: Releases initialized - LastReleaseID=%s', self.name, self.last_release_id)
                 else:
-                    log(f"  {self.name}: No releases found")
+                    log.info("  %s: No releases found", self.name)
             else:
-                log(f"  {self.name}: Failed to initialize releases - Status: {url.status}", "ERROR")
+                log.error("  %s: Failed to initialize releases - Status: %s", self.name, url.status)
         except Exception as e:
-            log(f"  {self.name}: Error initializing releases: {e}", "ERROR")
+            log.error("  %s: Error initializing releases: %s", self.name, e)
     
     async def initialize_tagged_release(self):
         try:
-            tag_url = f"https://api.github.com/repos/{self.name}/releases/tags/{self.tag_name}"
-            log(f"  {self.name}: Making API request to {tag_url}")
-            response = http.request('GET', url=tag_url, headers=self.Headers, timeout=30)
-            log(f"  {self.name}: Tagged release API response: {response.status}")
+            log.debug("  %s: Making API request to %s", self.name, self.tag_url)
+            response = await self.fetch(self.tag_url)
+            if response is None:
+                return
+            log.debug("  %s: Tagged release API response: %s", self.name, response.status)
             
-            if response.status == 200 and response.data:
-                data = json.loads(response.data)
+            if response.status == 200:
+                data = response.json()
+                self.remember_validators(self.tag_url, response)
                 if data.get('assets'):
-                    self.tracked_asset_ids = [asset['id'] for asset in data['assets']]
-                    log(f'  {self.name}: Tagged release initialized - Tracking {len(self.tracked_asset_ids)} assets for tag {self.tag_name}', "SUCCESS")
+                    self.tracked_assets = asset_signatures(decode.decode_release(data, with_assets=True).assets)
+                    log.success('  %s: Tagged release initialized - Tracking %s assets for tag %s', self.name, len(self.tracked_assets), self.tag_name)
                 else:
-                    log(f"  {self.name}: No assets found for tag {self.tag_name}")
-                    self.tracked_asset_ids = []
+                    log.info("  %s: No assets found for tag %s", self.name, self.tag_name)
+                    self.tracked_assets = TrackedAssets()
             else:
-                log(f"  {self.name}: Failed to initialize tagged release - Status: {response.status}", "ERROR")
+                log.error("  %s: Failed to initialize tagged release - Status: %s", self.name, response.status)
                 
         except Exception as e:
-            log(f"  {self.name}: Error initializing tagged release: {e}", "ERROR")
+            log.error("  %s: Error initializing tagged release: %s", self.name, e)
 
     async def check_github(self):
         try:
-            if self.thread_id:
-                channel = bot.get_channel(self.thread_id)
-                log(f"  {self.name}: Starting GitHub check - Tracking: {self.tracked_events} (Thread: {self.thread_id})")
-            else:
-                id = int(os.getenv('channel_id'))
-                channel = bot.get_channel(id)
-                log(f"  {self.name}: Starting GitHub check - Tracking: {self.tracked_events} (Default channel)")
+            channel_id = self.channel_id()
+            log.debug("  %s: Starting GitHub check - Tracking: %s (Channel: %s)", self.name, self.tracked_events, channel_id)
 
-            # check rate limit
-            try:
-                log(f"  {self.name}: Checking rate limit...")
-                rate_url = http.request('GET', 'https://api.github.com/rate_limit', headers=self.Headers, timeout=30)
-                if rate_url.status == 200:
-                    rate_data = json.loads(rate_url.data)
-                    remaining = rate_data["resources"]["core"]["remaining"]
-                    log(f"  {self.name}: Rate limit remaining: {remaining}")
-                    if remaining <= 10:
-                        log(f'  {self.name}: Rate limited - skipping check')
-                        return
-                else:
-                    log(f"  {self.name}: Rate limit check failed: {rate_url.status}", "ERROR")
-            except Exception as e:
-                log(f"  {self.name}: Rate limit check exception: {e}", "ERROR")
+            # the budget of this repo's token is fed from the rate limit headers of earlier responses, so no extra request here
+            other_events = self.other_events
+            polls_events = bool(other_events) and self.feed is None and not self.webhook
+            polls_releases = "ReleaseEvent" in self.tracked_events and not self.webhook
+            polls_tag = "TaggedReleaseEvent" in self.tracked_events and bool(self.tag_name)
+            if not self.repo_breaker.allows():
+                log.debug("  %s: Skipping check, the repository breaker is open (%s)", self.name, self.repo_breaker.reason)
+                return
+            # endpoints backing off don't need budget, they're skipped in fetch
+            cost = (polls_releases and self.prefetched_releases is None and self.can_fetch(self.releases_url)) + (polls_tag and self.prefetched_tag is None and self.can_fetch(self.tag_url)) + (polls_events and self.can_fetch(self.url))
+            if not github_http.token_for(self.url).budget.allows(cost):
+                log.warning('  %s: Rate limit budget spent - deferring check to next cycle', self.name)
+                return
 
-            # check releases if ReleaseEvent is tracked
-            if "ReleaseEvent" in self.tracked_events:
-                log(f"  {self.name}: Checking releases...")
-                await self.check_releases(channel)
+            # check releases if ReleaseEvent is tracked, webhook repos get them delivered
+            if polls_releases:
+                log.debug("  %s: Checking releases...", self.name)
+                await self.check_releases(channel_id)
             
             # check tagged releases if TaggedReleaseEvent is tracked
-            if "TaggedReleaseEvent" in self.tracked_events and self.tag_name:
-                log(f"  {self.name}: Checking tagged release for tag '{self.tag_name}'...")
-                await self.check_tagged_release(channel)
-
-            # check other events
-            other_events = [event for event in self.tracked_events if event not in ["ReleaseEvent", "TaggedReleaseEvent"]]
-            if other_events:
-                log(f"  {self.name}: Checking other events: {other_events}")
-                await self.check_events(channel, other_events)
+            if polls_tag:
+                log.debug("  %s: Checking tagged release for tag '%s'...", self.name, self.tag_name)
+                await self.check_tagged_release(channel_id)
+
+            # check other events, unless they come from an org feed or webhooks
+            if polls_events:
+                log.debug("  %s: Checking other events: %s", self.name, other_events)
+                await self.check_events(channel_id, other_events)
+            elif other_events and self.webhook:
+                log.debug("  %s: Events come from webhooks", self.name)
+            elif other_events:
+                log.debug("  %s: Events come from the %s feed", self.name, self.feed.org)
             else:
-                log(f"  {self.name}: No other events to check")
+                log.debug("  %s: No other events to check", self.name)
 
-            log(f"  {self.name}: GitHub check completed", "SUCCESS")
+            log.debug("  %s: GitHub check completed", self.name)
 
         except Exception as e:
-            log(f"  {self.name}: Unexpected error in check_github: {e}", "ERROR")
-            traceback.print_exc()
+            log.exception("  %s: Unexpected error in check_github: %s", self.name, e)
 
-    async def check_releases(self, channel):
+    def queue_releases(self, channel_id, new_releases):
+        # build discord messages for new releases (oldest first)
+        embeds = []
+        with profiling.timed('render', self.name):
+            for release in reversed(new_releases):
+                try:
+                    embed = MakeReleaseEmbed(decode.decode_release(release), self.name)
+                    if embed:
+                        embeds.append(embed)
+                        log.debug("    %s: Queued release embed for %s", self.name, release.get('tag_name', 'Unknown'))
+                    else:
+                        log.error("    %s: Failed to create embed for release", self.name)
+                except Exception as e:
+                    log.error("    %s: Error creating release embed: %s", self.name, e)
+
+        seen = {}
+        if new_releases:
+            self.found_new = True
+            old_id = self.last_release_id
+            seen = self.mark_seen("release", (as_id(release['id']) for release in new_releases))
+            self.last_release_id = max(as_id(old_id), as_id(new_releases[0]['id']))
+            log.success('    %s: Updated release tracking from %s to %s (%s new)', self.name, old_id, self.last_release_id, len(new_releases))
+        self.deliver(channel_id, embeds, {"releases_etag": self.etag_for(self.releases_url), "last_release_id": self.last_release_id, **seen})
+
+    def check_prefetched_releases(self, channel_id, releases):
+        # releases from the graphql query, returns False if the stored release isn't among them
+        # so the rest path (which can page back further) takes over
+        log.debug("    %s: Got %s releases from GraphQL", self.name, len(releases))
+        if not releases:
+            return True
+        if not self.seen_releases:
+            log.info("    %s: No stored release ID - updating to latest release without sending", self.name)
+            seen = self.mark_seen("release", (as_id(release['id']) for release in releases))
+            self.last_release_id = max(as_id(release['id']) for release in releases)
+            self.deliver(channel_id, [], {"last_release_id": self.last_release_id, **seen})
+            return True
+
+        with profiling.timed('diff', self.name):
+            if not any(as_id(release['id']) in self.seen_releases for release in releases):
+                return False
+            new_releases = [release for release in releases if as_id(release['id']) not in self.seen_releases]
+            new_releases.sort(key=lambda release: as_id(release['id']), reverse=True)
+        for release in new_releases:
+            log.debug("    %s: Found new release: %s (ID: %s)", self.name, release.get('tag_name', 'Unknown'), release['id'])
+        self.queue_releases(channel_id, new_releases)
+        return True
+
+    async def check_releases(self, channel_id):
         # more logging than code because this api is wacky af
         try:
-            log(f"    {self.name}: Making releases API request...")
-            url = http.request('GET', url=self.releases_url, headers=self.releases_headers, timeout=30)
+            prefetched, self.prefetched_releases = self.prefetched_releases, None
+            if prefetched is not None:
+                if self.check_prefetched_releases(channel_id, prefetched):
+                    return
+                log.warning("    %s: Stored release %s not in GraphQL results, falling back to REST", self.name, self.last_release_id)
+
+            log.debug("    %s: Making releases API request...", self.name)
+            url = await self.fetch(self.releases_url)
+            if url is None:
+                return
 
             if url.status == 200:
-                data = json.loads(url.data)
-                log(f"    {self.name}: Received {len(data) if data else 0} releases")
+                with profiling.timed('decode', self.name):
+                    data = url.json()
+                log.debug("    %s: Received %s releases", self.name, len(data) if data else 0)
                 
                 if not data:
-                    log(f"    {self.name}: No releases data")
+                    log.debug("    %s: No releases data", self.name)
                     return
 
-                # validate last release exists
-                if not self.validate_last_id_exists(self.last_release_id, data):
-                    log(f"    {self.name}: Updating to latest release without sending")
-                    self.releases_headers["if-none-match"] = url.headers.get("ETag", "")
-                    self.last_release_id = data[0]['id']
+                # nothing stored yet, start from the newest release without sending
+                if not self.seen_releases:
+                    log.info("    %s: No stored release ID - updating to latest release without sending", self.name)
+                    self.remember_validators(self.releases_url, url)
+                    seen = self.mark_seen("release", (as_id(release['id']) for release in data))
+                    self.last_release_id = max(as_id(release['id']) for release in data)
+                    self.deliver(channel_id, [], {"releases_etag": self.etag_for(self.releases_url), "last_release_id": self.last_release_id, **seen})
                     return
 
-                # find new releases
-                new_releases = []
-                for release in data:
-                    if release['id'] != self.last_release_id:
-                        new_releases.append(release)
-                        log(f"    {self.name}: Found new release: {release.get('tag_name', 'Unknown')} (ID: {release['id']})")
-                    else:
-                        log(f"    {self.name}: Reached known release {release['id']}, stopping")
-                        break
-
-                # send discord messages for new releases (oldest first)
-                for release in reversed(new_releases):
-                    try:
-                        log(f"    {self.name}: Sending release embed for {release.get('tag_name', 'Unknown')}")
-                        embed = MakeReleaseEmbed(release, self.name)
-                        if embed:
-                            await channel.send(embed=embed)
-                            log(f"    {self.name}: Successfully sent release {release.get('tag_name', 'Unknown')}")
-                        else:
-                            log(f"    {self.name}: Failed to create embed for release", "ERROR")
-                    except Exception as e:
-                        log(f"    {self.name}: Error sending release embed: {e}", "ERROR")
-
-                if new_releases:
-                    old_id = self.last_release_id
-                    self.releases_headers["if-none-match"] = url.headers.get("ETag", "")
-                    self.last_release_id = data[0]['id']
-                    log(f'    {self.name}: Updated release tracking from {old_id} to {self.last_release_id} ({len(new_releases)} new)', "SUCCESS")
+                # find new releases, following older pages if there were a lot of them
+                new_releases, reached = await self.collect_new(url, data, self.seen_releases)
+                for release in new_releases:
+                    log.debug("    %s: Found new release: %s (ID: %s)", self.name, release.get('tag_name', 'Unknown'), release['id'])
+                if not reached:
+                    log.warning("    %s: Stored release %s not reached, older releases may be missing", self.name, self.last_release_id)
+
+                # keep the new etag even if nothing was new, otherwise every check is a full 200
+                self.remember_validators(self.releases_url, url)
+                self.queue_releases(channel_id, new_releases)
 
             elif url.status == 304:
-                log(f"    {self.name}: No new releases (304)")
+                log.debug("    %s: No new releases (304)", self.name)
 
             else:
-                log(f"    {self.name}: Releases API error: {url.status}", "ERROR")
+                log.error("    %s: Releases API error: %s", self.name, url.status)
 
         except Exception as e:
-            log(f"    {self.name}: Error checking releases: {e}", "ERROR")
+            log.error("    %s: Error checking releases: %s", self.name, e)
+
+    def event_embeds(self, new_events, tracked_events):
+        # untracked events are dropped before decoding, the rest become compact records (oldest first)
+        with profiling.timed('decode', self.name):
+            records = decode.decode_events(reversed(new_events), tracked_events)
+        tracked_count = len(records)
+        if tracked_count < len(new_events):
+            log.debug("    %s: Skipping %s untracked events", self.name, len(new_events) - tracked_count)
+        records = digest.coalesce(records, self.digest_threshold)
+        if len(records) < tracked_count:
+            log.debug("    %s: Merged %s events into digests", self.name, tracked_count - len(records))
+
+        embeds = []
+        with profiling.timed('render', self.name):
+            for event in records:
+                try:
+                    embed = MakeEmbed(event)
+                    if embed:
+                        embeds.append(embed)
+                        log.debug("    %s: Queued %s embed", self.name, event.type)
+                    else:
+                        log.debug("    %s: Nothing to show for %s (action: %s)", self.name, event.type, event.action)
+                except Exception as e:
+                    log.error("    %s: Error creating event embed: %s", self.name, e)
+        return embeds, tracked_count
+
+    def start_from_feed(self, feed_cursor):
+        # everything up to the feed's newest event counts as seen, without sending any of it
+        self.seen_events = SeenIds((), feed_cursor)
+        self.lastid = str(feed_cursor)
+        log.info("    %s: No stored event ID - starting from the %s feed at %s", self.name, self.feed.org, feed_cursor)
+        self.deliver(self.channel_id(), [], {"last_event_id": self.lastid, "seen_event_floor": feed_cursor})
+
+    def handle_feed_events(self, events):
+        # this repo's share of an org feed poll (newest first), anything in our seen ids was handled already
+        if not self.seen_events:
+            return
+        with profiling.timed('diff', self.name):
+            new_events = [event for event in events if as_id(event['id']) not in self.seen_events]
+        if not new_events:
+            return
+        embeds, tracked_count = self.event_embeds(new_events, self.other_events)
+        self.found_new = True
+        old_id = self.lastid
+        seen = self.mark_seen("event", (as_id(event['id']) for event in new_events))
+        self.lastid = str(max(as_id(old_id), as_id(new_events[0]['id'])))
+        log.success('    %s: Updated event tracking from %s to %s via the %s feed (%s/%s tracked)', self.name, old_id, self.lastid, self.feed.org, tracked_count, len(new_events))
+        self.deliver(self.channel_id(), embeds, {"last_event_id": self.lastid, **seen})
 
-    async def check_events(self, channel, tracked_events):
+    def handle_webhook(self, event):
+        # one webhook delivery in the events api shape, published releases go the same way as polled ones
+        channel_id = self.channel_id()
+        if event['type'] == "ReleaseEvent":
+            release = event['payload'].get('release')
+            if "ReleaseEvent" in self.tracked_events and event['payload'].get('action') == "published" and release and as_id(release['id']) not in self.seen_releases:
+                self.queue_releases(channel_id, [release])
+            return
+        embeds, tracked_count = self.event_embeds([event], self.other_events)
+        if not tracked_count:
+            return
+        self.found_new = True
+        log.success('    %s: Got a %s from a webhook', self.name, event['type'])
+        self.deliver(channel_id, embeds, {})
+
+    async def check_events(self, channel_id, tracked_events):
         try:
-            log(f"    {self.name}: Making events API request...")
-            url = http.request('GET', url=self.url, headers=self.Headers, timeout=30)
-            log(f"    {self.name}: Events response: {url.status}")
+            log.debug("    %s: Making events API request...", self.name)
+            url = await self.fetch(self.url)
+            if url is None:
+                return
+            log.debug("    %s: Events response: %s", self.name, url.status)
+            self.poll_interval = int(url.headers.get("X-Poll-Interval", self.poll_interval))
 
             if url.status == 200:
-                data = json.loads(url.data)
-                log(f"    {self.name}: Received {len(data) if data else 0} events")
+                with profiling.timed('decode', self.name):
+                    data = url.json()
+                log.debug("    %s: Received %s events", self.name, len(data) if data else 0)
                 
                 if not data:
-                    log(f"    {self.name}: No events data")
+                    log.debug("    %s: No events data", self.name)
                     return
 
-                # TODO: there is bug that if the last tracked event is very old and not in the last 30 events
-                # it resets to the latest event and skips sending anything
-                # but idk how to fix it without storing even more state, just seems like a pain
-                # and anyway idrc about this events stuff, mostly the releases
-                if not self.validate_last_id_exists(self.lastid, data):
-                    log(f"    {self.name}: Updating to latest event without sending")
-                    self.Headers["if-none-match"] = url.headers.get("ETag", "")
-                    self.lastid = str(data[0]['id'])
+                # nothing stored yet, start from the newest event without sending
+                if not self.seen_events:
+                    log.info("    %s: No stored event ID - updating to latest event without sending", self.name)
+                    self.remember_validators(self.url, url)
+                    seen = self.mark_seen("event", (as_id(event['id']) for event in data))
+                    self.lastid = str(max(as_id(event['id']) for event in data))
+                    self.deliver(channel_id, [], {"etag": self.etag_for(self.url), "last_event_id": self.lastid, **seen})
                     return
 
-                # find new events
-                new_events = []
-                for event in data:
-                    if str(event['id']) != str(self.lastid):
-                        new_events.append(event)
-                        log(f"    {self.name}: Found new event: {event['type']} (ID: {event['id']})")
-                    else:
-                        log(f"    {self.name}: Reached known event {event['id']}, stopping")
-                        break
-
-                # filter and send events
-                tracked_count = 0
-                for event in reversed(new_events):
-                    if event['type'] in tracked_events:
-                        tracked_count += 1
-                        try:
-                            log(f"    {self.name}: Sending {event['type']} embed...")
-                            embed = MakeEmbed(event)
-                            if embed:
-                                await channel.send(embed=embed)
-                                log(f"    {self.name}: Successfully sent {event['type']} event")
-                            else:
-                                log(f"    {self.name}: Failed to create embed for {event['type']}", "ERROR")
-                        except Exception as e:
-                            log(f"    {self.name}: Error sending event embed: {e}", "ERROR")
-                    else:
-                        log(f"    {self.name}: Skipping {event['type']} (not tracked)")
+                # find new events, following older pages after downtime or a burst
+                # (github only serves the last 300 events / 10 pages)
+                new_events, reached = await self.collect_new(url, data, self.seen_events)
+                for event in new_events:
+                    log.debug("    %s: Found new event: %s (ID: %s)", self.name, event['type'], event['id'])
+                if not reached:
+                    log.warning("    %s: Stored event %s not reached, older events may be missing", self.name, self.lastid)
 
+                embeds, tracked_count = self.event_embeds(new_events, tracked_events)
+                self.remember_validators(self.url, url)
+                seen = {}
                 if new_events:
+                    self.found_new = True
                     old_id = self.lastid
-                    self.Headers["if-none-match"] = url.headers.get("ETag", "")
-                    self.lastid = str(data[0]['id'])
-                    log(f'    {self.name}: Updated event tracking from {old_id} to {self.lastid} ({tracked_count}/{len(new_events)} tracked)', "SUCCESS")
+                    seen = self.mark_seen("event", (as_id(event['id']) for event in new_events))
+                    self.lastid = str(max(as_id(old_id), as_id(new_events[0]['id'])))
+                    log.success('    %s: Updated event tracking from %s to %s (%s/%s tracked)', self.name, old_id, self.lastid, tracked_count, len(new_events))
+                self.deliver(channel_id, embeds, {"etag": self.etag_for(self.url), "last_event_id": self.lastid, **seen})
 
             elif url.status == 304:
-                log(f"    {self.name}: No new events (304)")
+                log.debug("    %s: No new events (304)", self.name)
 
             else:
-                log(f"    {self.name}: Events API error: {url.status}", "ERROR")
+                log.error("    %s: Events API error: %s", self.name, url.status)
 
         except Exception as e:
-            log(f"    {self.name}: Error checking events: {e}", "ERROR")
+            log.error("    %s: Error checking events: %s", self.name, e)
 
-    async def check_tagged_release(self, channel):
+    def handle_tagged_release(self, channel_id, data):
+        with profiling.timed('decode', self.name):
+            release = decode.decode_release(data, with_assets=True)
+        assets = release.assets
+        current_assets = asset_signatures(assets)
+        
+        log.debug("    %s: Current assets: %s, Tracked: %s", self.name, len(current_assets), len(self.tracked_assets))
+        
+        # an asset is new if its id is unknown, changed if its updated_at/size signature differs
+        # (None = saved before signatures were kept, accepted as is)
+        new_assets = []
+        for asset in assets:
+            known = self.tracked_assets.get(asset.id, MISSING)
+            if known is MISSING or (known is not None and known != current_assets.get(asset.id)):
+                if not self.tracked_assets:
+                    # first time setup so dont send notifications
+                    log.debug("    %s: Initial asset tracking setup for %s", self.name, asset.name)
+                    continue
+                else:
+                    # this is either a new asset or a changed asset
+                    new_assets.append(asset)
+                    log.debug("    %s: New/changed asset: %s (ID: %s)", self.name, asset.name, asset.id)
+        
+        embeds = []
+        if new_assets:
+            self.found_new = True
+            # one embed with all new/changed assets
+            try:
+                with profiling.timed('render', self.name):
+                    embed = MakeTaggedReleaseEmbed(release, new_assets, self.name, self.tag_name)
+                if embed:
+                    embeds.append(embed)
+                    log.debug("    %s: Queued tagged release embed for %s assets", self.name, len(new_assets))
+                else:
+                    log.error("    %s: Failed to create tagged release embed", self.name)
+            except Exception as e:
+                log.error("    %s: Error creating tagged release embed: %s", self.name, e)
+        
+        # update tracked assets
+        if current_assets != self.tracked_assets:
+            old_count = len(self.tracked_assets)
+            self.tracked_assets = current_assets
+            log.success('    %s: Updated asset tracking from %s to %s assets', self.name, old_count, len(current_assets))
+        self.deliver(channel_id, embeds, {
+            "tag_etag": self.etag_for(self.tag_url),
+            "tracked_asset_ids": current_assets.ids,
+            "tracked_asset_signatures": current_assets.signatures,
+        })
+
+    async def check_tagged_release(self, channel_id):
         try:
-            tag_url = f"https://api.github.com/repos/{self.name}/releases/tags/{self.tag_name}"
-            log(f"    {self.name}: Making tagged release API request...")
-            response = http.request('GET', url=tag_url, headers=self.Headers, timeout=30)
+            prefetched, self.prefetched_tag = self.prefetched_tag, None
+            if prefetched is False:
+                log.debug("    %s: Tag %s not found (GraphQL)", self.name, self.tag_name)
+                return
+            if prefetched is not None:
+                log.debug("    %s: Got tagged release from GraphQL", self.name)
+                self.handle_tagged_release(channel_id, prefetched)
+                return
+
+            log.debug("    %s: Making tagged release API request...", self.name)
+            response = await self.fetch(self.tag_url)
+            if response is None:
+                return
             
-            if response.status == 200 and response.data:
-                data = json.loads(response.data)
-                current_asset_ids = [asset['id'] for asset in data.get('assets', [])]
-                
-                log(f"    {self.name}: Current assets: {len(current_asset_ids)}, Tracked: {len(self.tracked_asset_ids)}")
-                
-                # check for new or changed assets
-                new_asset_ids = [aid for aid in current_asset_ids if aid not in self.tracked_asset_ids]
-                new_assets = []
-                
-                # fFind assets that changed (different Ids in same positions) or are completely new
-                for asset in data.get('assets', []):
-                    if asset['id'] in new_asset_ids:
-                        if len(self.tracked_asset_ids) == 0:
-                            # first time setup so dont send notifications
-                            log(f"    {self.name}: Initial asset tracking setup for {asset['name']}")
-                            continue
-                        else:
-                            # this is either a new asset or a changed asset
-                            new_assets.append(asset)
-                            log(f"    {self.name}: New/changed asset: {asset['name']} (ID: {asset['id']})")
-                
-                if new_assets:
-                    # send embed with all new/changed assets
-                    try:
-                        log(f"    {self.name}: Sending tagged release embed for {len(new_assets)} assets...")
-                        embed = MakeTaggedReleaseEmbed(data, new_assets, self.name, self.tag_name)
-                        if embed:
-                            await channel.send(embed=embed)
-                            log(f"    {self.name}: Successfully sent tagged release update")
-                        else:
-                            log(f"    {self.name}: Failed to create tagged release embed", "ERROR")
-                    except Exception as e:
-                        log(f"    {self.name}: Error sending tagged release embed: {e}", "ERROR")
-                
-                # update tracked asset IDs
-                if current_asset_ids != self.tracked_asset_ids:
-                    old_count = len(self.tracked_asset_ids)
-                    self.tracked_asset_ids = current_asset_ids
-                    log(f'    {self.name}: Updated asset tracking from {old_count} to {len(current_asset_ids)} assets', "SUCCESS")
-                    
+            if response.status == 200:
+                self.remember_validators(self.tag_url, response)
+                with profiling.timed('decode', self.name):
+                    data = response.json()
+                self.handle_tagged_release(channel_id, data)
+            elif response.status == 304:
+                log.debug("    %s: No changes to tag %s (304)", self.name, self.tag_name)
             elif response.status == 404:
-                log(f"    {self.name}: Tag {self.tag_name} not found (404)")
+                log.debug("    %s: Tag %s not found (404)", self.name, self.tag_name)
             else:
-                log(f"    {self.name}: Tagged release API error: {response.status}", "ERROR")
+                log.error("    %s: Tagged release API error: %s", self.name, response.status)
                 
         except Exception as e:
-            log(f"    {self.name}: Error checking tagged release: {e}", "ERROR")
+            log.error("    %s: Error checking tagged release: %s", self.name, e)
     
-keep_alive()
-bot.run(os.getenv('discord_token'))
\ No newline at end of file
+if __name__ == '__main__':
+    bot.run(os.getenv('discord_token'))
+    if shard:
+        shard.leave()
\ No newline at end of file
@@ -1,104 +1,197 @@
 import discord
 import re
-from markdownify import markdownify as md
 from datetime import datetime
 
 github_icon_url = "https://github.githubassets.com/images/modules/logos_page/GitHub-Mark.png"
 
-def MakeEmbed(json):
-  embed = discord.Embed()
-  user = json["actor"]["login"]
-  userlink = f'https://github.com/{user}'
-  repo = json["repo"]["name"]
-  embed.set_thumbnail(url=json["actor"]["avatar_url"])
-  embed.color = discord.Colour.from_str("#43f770")
-
-  if json["type"] == "WatchEvent":
-    embed.title = '' # so it isnt None on the length check and raises a error
-    embed.description = f'[{user}]({userlink}) starred {repo}!'
-  elif json["type"] == "IssueCommentEvent" and json["payload"]["action"] == "created":
-    embed.url = json["payload"]["issue"]["html_url"]
-    embed.title = f'{user} commented on {json["repo"]["name"]}#{json["payload"]["issue"]["number"]}'
-    embed.description = json["payload"]["comment"]["body"]
-  elif json["type"] == "IssuesEvent":
-    link = json["payload"]["issue"]["html_url"]
-    issue = f'{json["repo"]["name"]}#{json["payload"]["issue"]["number"]}'
-    embed.url = link
-    if json["payload"]["action"] == "opened":
-      embed.title = f'{user} opened issue: {issue} {json["payload"]["issue"]["title"]}'
-      embed.description = json["payload"]["issue"]["body"]
-    elif json["payload"]["action"] == "closed":
-      embed.title = f'{user} closed issue: {issue}'
-      embed.description = f'reason: {json["payload"]["issue"]["state_reason"]}'
-  elif json["type"] == "PullRequestEvent":
-    link = json["payload"]["pull_request"]["html_url"]
-    embed.url = link
-    pr = f'{json["repo"]["name"]}#{json["payload"]["number"]}'
-    if json["payload"]["action"] == "opened":
-      embed.title = f'{user} opened pull request: {pr} {json["payload"]["pull_request"]["title"]}'
-      embed.description = json["payload"]["pull_request"]["body"]
-    elif json["payload"]["action"] == "closed":
-      embed.title = f'{user} closed pull request: {pr}'
-      embed.description = f'merged: {json["payload"]["pull_request"]["merged"]}'
-  elif json["type"] == "ForkEvent":
-     link = f'https://github.com/{json["payload"]["forkee"]["full_name"]}'
-     embed.url = link
-     embed.title = f'{user} forked {repo}'
-     embed.description = '' # so it isnt None on the length check and raises a error
-  elif json["type"] == "ReleaseEvent":
-     link = json["payload"]["release"]["html_url"]
-     embed.url = link
-     embed.title = f'{user} published a release for {repo}: {json["payload"]["release"]["tag_name"]}'
-     embed.description = json["payload"]["release"]["body"]
-  elif json["type"] == "PushEvent":
-     link = f'https://github.com/{repo}/compare/{json["payload"]["before"]}..{json["payload"]["head"]}'
-     embed.url = link
-     embed.title = f'{user} pushed {json["payload"]["size"]} commit(s) to {repo}'
-     embed.description = ''
-     for i in json["payload"]["commits"]:
-       embed.description += f'[{i["sha"][0:6]}]({trimlink(i["url"])}) - {i["message"]} - {i["author"]["name"]} \n'
-  else:
-     return None
-
-  if len(embed.description) > 4096:
-    embed.description = "[body was too long, please visit the link]"
-
-  if len(embed.title) > 256:
-    embed.title = "[title was too long, click here]"
-    
+# discords limits
+TITLE_LIMIT = 256
+DESCRIPTION_LIMIT = 4096
+TOO_LONG_TITLE = "[title was too long, click here]"
+TOO_LONG_BODY = "\n[body was too long, please visit the link]"
+
+# built once instead of parsing the hex string for every embed
+event_colour = discord.Colour.from_str("#43f770")
+release_colour = discord.Colour.from_str("#238636")
+tagged_release_colour = discord.Colour.from_str("#ffa500")
+
+class Description:
+  # builds a description piece by piece and stops adding once discords limit would be passed,
+  # leaving room for a note at the end, so nothing long gets built just to be thrown away
+  def __init__(self, limit=DESCRIPTION_LIMIT, reserve=len(TOO_LONG_BODY)):
+    self.parts = []
+    self.length = 0
+    self.limit = limit - reserve
+    self.full = False
+
+  def add(self, text):
+    if self.full or self.length + len(text) > self.limit:
+      self.full = True
+      return False
+    self.parts.append(text)
+    self.length += len(text)
+    return True
+
+  def text(self):
+    return ''.join(self.parts)
+
+def clip(text, limit=DESCRIPTION_LIMIT, note=TOO_LONG_BODY):
+  if text is None or len(text) <= limit:
+    return text
+  return text[:limit - len(note)] + note
+
+# (event type, payload action) -> function filling in the embed, action None matches any action
+RENDERERS = {}
+
+def renderer(event_type, action=None):
+  def register(render):
+    RENDERERS[(event_type, action)] = render
+    return render
+  return register
+
+@renderer("WatchEvent")
+def render_watch(embed, event, user):
+  embed.description = f'[{user}](https://github.com/{user}) starred {event.repo}!'
+
+@renderer("IssueCommentEvent", "created")
+def render_issue_comment(embed, event, user):
+  embed.url = event.html_url
+  embed.title = f'{user} commented on {event.repo}#{event.number}'
+  embed.description = clip(event.body)
+
+@renderer("IssuesEvent", "opened")
+def render_issue_opened(embed, event, user):
+  embed.url = event.html_url
+  embed.title = f'{user} opened issue: {event.repo}#{event.number} {event.title}'
+  embed.description = clip(event.body)
+
+@renderer("IssuesEvent", "closed")
+def render_issue_closed(embed, event, user):
+  embed.url = event.html_url
+  embed.title = f'{user} closed issue: {event.repo}#{event.number}'
+  embed.description = f'reason: {event.state_reason}'
+
+@renderer("PullRequestEvent", "opened")
+def render_pull_request_opened(embed, event, user):
+  embed.url = event.html_url
+  embed.title = f'{user} opened pull request: {event.repo}#{event.number} {event.title}'
+  embed.description = clip(event.body)
+
+@renderer("PullRequestEvent", "closed")
+def render_pull_request_closed(embed, event, user):
+  embed.url = event.html_url
+  embed.title = f'{user} closed pull request: {event.repo}#{event.number}'
+  embed.description = f'merged: {event.merged}'
+
+@renderer("ForkEvent")
+def render_fork(embed, event, user):
+  embed.url = f'https://github.com/{event.forkee}'
+  embed.title = f'{user} forked {event.repo}'
+
+@renderer("ReleaseEvent")
+def render_release(embed, event, user):
+  embed.url = event.html_url
+  embed.title = f'{user} published a release for {event.repo}: {event.tag_name}'
+  embed.description = clip(event.body)
+
+def commit_list(commits):
+  description = Description()
+  for i, commit in enumerate(commits):
+    if not description.add(f'[{commit.sha[0:6]}]({trimlink(commit.url)}) - {commit.message} - {commit.author} \n'):
+      description.parts.append(f'... and {len(commits) - i} more')
+      break
+  return description.text()
+
+@renderer("PushEvent")
+def render_push(embed, event, user):
+  embed.url = f'https://github.com/{event.repo}/compare/{event.before}..{event.head}'
+  embed.title = f'{user} pushed {event.size} commit(s) to {event.repo}'
+  embed.description = commit_list(event.commits)
+
+# digest.DigestRecords, a burst of events of one kind in one embed. event.events are the merged records oldest first
+
+@renderer("PushEvent", "digest")
+def render_push_digest(embed, digest, users):
+  first, last = digest.events[0], digest.events[-1]
+  branch = (last.ref or '').removeprefix('refs/heads/')
+  embed.url = f'https://github.com/{digest.repo}/compare/{first.before}..{last.head}'
+  embed.title = f'{users} pushed {sum(event.size or 0 for event in digest.events)} commit(s) to {digest.repo} ({branch}) in {len(digest.events)} pushes'
+  embed.description = commit_list([commit for event in digest.events for commit in event.commits or []])
+
+@renderer("IssueCommentEvent", "digest")
+def render_issue_comment_digest(embed, digest, users):
+  embed.url = digest.events[-1].html_url
+  embed.title = f'{len(digest.events)} comments on {digest.repo}#{digest.events[-1].number}'
+  description = Description()
+  for i, event in enumerate(digest.events):
+    body = ' '.join((event.body or '').split())
+    if not description.add(f'**{event.actor}**: {body[:200]}{"..." if len(body) > 200 else ""}\n'):
+      description.parts.append(f'... and {len(digest.events) - i} more')
+      break
+  embed.description = description.text()
+
+@renderer("WatchEvent", "digest")
+def render_watch_digest(embed, digest, users):
+  embed.description = f'{digest.repo} got {len(digest.events)} new stars from {users}!'
+
+@renderer("ForkEvent", "digest")
+def render_fork_digest(embed, digest, users):
+  embed.url = f'https://github.com/{digest.repo}/network/members'
+  embed.title = f'{digest.repo} was forked {len(digest.events)} times'
+  description = Description()
+  for i, event in enumerate(digest.events):
+    if not description.add(f'[{event.forkee}](https://github.com/{event.forkee})\n'):
+      description.parts.append(f'... and {len(digest.events) - i} more')
+      break
+  embed.description = description.text()
+
+def renders(event_type, action):
+  # whether MakeEmbed has anything for this event type/action
+  return (event_type, action) in RENDERERS or (event_type, None) in RENDERERS
+
+def MakeEmbed(event):
+  # event is a decode.EventRecord or digest.DigestRecord, returns None for event types/actions there is no renderer for
+  render = RENDERERS.get((event.type, event.action)) or RENDERERS.get((event.type, None))
+  if render is None:
+    return None
+
+  embed = discord.Embed(color=event_colour)
+  embed.set_thumbnail(url=event.avatar_url)
+  render(embed, event, event.actor)
+
+  if embed.title and len(embed.title) > TITLE_LIMIT:
+    embed.title = TOO_LONG_TITLE
+
   return embed
 
 # I tried to make it like the github webhook release embed but it kinda sucks
-def MakeReleaseEmbed(release_data, repo_name):
+def MakeReleaseEmbed(release, repo_name):
+    # release is a decode.ReleaseRecord
     embed = discord.Embed()
     
-    author = release_data["author"]["login"]
-    author_url = release_data["author"]["html_url"]
-    author_avatar = release_data["author"]["avatar_url"]
-    
-    embed.set_author(name=f"{author}", url=author_url, icon_url=author_avatar)
-    embed.color = discord.Colour.from_str("#238636")
+    embed.set_author(name=f"{release.author_login}", url=release.author_url, icon_url=release.author_avatar)
+    embed.color = release_colour
     
-    embed.title = f"Release {release_data['tag_name']}"
-    embed.url = release_data["html_url"]
+    embed.title = f"Release {release.tag_name}"
+    embed.url = release.html_url
     
     repo_url = f"https://github.com/{repo_name}"
     embed.description = f"**[{repo_name}]({repo_url})**\n"
     
-    if release_data["name"] and release_data["name"] != release_data["tag_name"]:
-        embed.description += f"**{release_data['name']}**\n"
+    if release.name and release.name != release.tag_name:
+        embed.description += f"**{release.name}**\n"
 
     # no release body because I want them to be short
     
-    if release_data.get("prerelease"):
+    if release.prerelease:
         embed.add_field(name="Type", value="Pre-release", inline=True)
-    elif release_data.get("draft"):
+    elif release.draft:
         embed.add_field(name="Type", value="Draft", inline=True)
     else:
         embed.add_field(name="Type", value="Release", inline=True)
     
-    if release_data.get("published_at"):
-        pub_date = datetime.fromisoformat(release_data["published_at"].replace('Z', '+00:00'))
+    if release.published_at:
+        pub_date = datetime.fromisoformat(release.published_at.replace('Z', '+00:00'))
         embed.timestamp = pub_date
     
     embed.set_footer(text="GitHub", icon_url=github_icon_url)
@@ -111,27 +204,25 @@ def trimlink(api_link: str):
   link = link.replace("commits", "commit")
   return link
 
-def MakeTaggedReleaseEmbed(release_data, new_assets, repo_name, tag_name):
+def MakeTaggedReleaseEmbed(release, new_assets, repo_name, tag_name):
+    # release is a decode.ReleaseRecord, new_assets a list of decode.AssetRecord
     embed = discord.Embed()
     
-    if release_data.get("author"):
-        author = release_data["author"]["login"]
-        author_url = release_data["author"]["html_url"]
-        author_avatar = release_data["author"]["avatar_url"]
-        embed.set_author(name=f"{author}", url=author_url, icon_url=author_avatar)
+    if release.author_login:
+        embed.set_author(name=f"{release.author_login}", url=release.author_url, icon_url=release.author_avatar)
     else:
         embed.set_author(name=f"{repo_name}", icon_url=github_icon_url)
     
-    embed.color = discord.Colour.from_str("#ffa500") 
+    embed.color = tagged_release_colour
     
     embed.title = f"Release {tag_name} - Assets Updated"
-    embed.url = release_data.get("html_url", "")
+    embed.url = release.html_url
     
     repo_url = f"https://github.com/{repo_name}"
     embed.description = f"**[{repo_name}]({repo_url})**\n"
     
-    if release_data.get("name") and release_data["name"] != tag_name:
-        embed.description += f"**{release_data['name']}**\n"
+    if release.name and release.name != tag_name:
+        embed.description += f"**{release.name}**\n"
     
     embed.add_field(name="Tag", value=f"`{tag_name}`", inline=True)
     embed.add_field(name="Assets Updated", value=str(len(new_assets)), inline=True)
@@ -139,8 +230,8 @@ def MakeTaggedReleaseEmbed(release_data, new_assets, repo_name, tag_name):
     if new_assets:
         asset_info = []
         for asset in new_assets[:5]:  
-            size_mb = round(asset.get('size', 0) / (1024 * 1024), 2)
-            asset_info.append(f"[{asset['name']}]({asset['browser_download_url']}) ({size_mb}MB)")
+            size_mb = round((asset.size or 0) / (1024 * 1024), 2)
+            asset_info.append(f"[{asset.name}]({asset.browser_download_url}) ({size_mb}MB)")
         
         embed.add_field(
             name="New/Updated Assets",
@@ -151,8 +242,8 @@ def MakeTaggedReleaseEmbed(release_data, new_assets, repo_name, tag_name):
         if len(new_assets) > 5:
             embed.add_field(name="", value=f"... and {len(new_assets) - 5} more assets available", inline=False)
     
-    if release_data.get("updated_at"):
-        pub_date = datetime.fromisoformat(release_data["updated_at"].replace('Z', '+00:00'))
+    if release.updated_at:
+        pub_date = datetime.fromisoformat(release.updated_at.replace('Z', '+00:00'))
         embed.timestamp = pub_date
     
     embed.set_footer(text="GitHub", icon_url=github_icon_url)
@@ -163,6 +254,9 @@ def sanitize_release_body(body):
     if not body:
         return ""
     
+    # markdownify pulls in beautifulsoup, only load it once a release body actually needs it
+    from markdownify import markdownify as md
+
     # no images n links
     body = md(body, strip=['img', 'a'])  
     
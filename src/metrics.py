@@ -0,0 +1,142 @@
+import os
+import time
+import token_pool
+from bisect import bisect_left
+
+# /healthz fails once the loop hasn't finished a tick for this many loop_time intervals
+health_intervals = int(os.getenv('health_intervals', 3))
+loop_time = int(os.getenv('loop_time', 300))
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+# everything here is plain dicts and floats updated on the bot's loop, the uptime server only reads
+# them when /metrics is scraped, so leaving it on costs a dict lookup and an add per observation
+
+def format_labels(names, values):
+    if not names:
+        return ''
+    pairs = ','.join(f'{name}="{str(value)}"' for name, value in zip(names, values))
+    return '{' + pairs + '}'
+
+class Counter:
+    kind = 'counter'
+
+    def __init__(self, name, help, labels=(), fn=None):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        # fn: read the value from somewhere else when scraped instead of counting here
+        self.fn = fn
+        self.values = {}
+
+    def inc(self, *label_values, amount=1):
+        self.values[label_values] = self.values.get(label_values, 0) + amount
+
+    def samples(self):
+        if self.fn is not None:
+            value = self.fn()
+            if isinstance(value, dict):
+                # labels -> value, for things like one series per token
+                return [(self.name, format_labels(self.labels, key), v) for key, v in value.items() if v is not None]
+            return [] if value is None else [(self.name, '', value)]
+        return [(self.name, format_labels(self.labels, key), value) for key, value in list(self.values.items())]
+
+class Gauge(Counter):
+    kind = 'gauge'
+
+    def set(self, value, *label_values):
+        self.values[label_values] = value
+
+class Histogram:
+    kind = 'histogram'
+
+    def __init__(self, name, help, labels=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.buckets = buckets
+        # labels -> [count per bucket (+inf last), sum]
+        self.values = {}
+
+    def observe(self, value, *label_values):
+        entry = self.values.get(label_values)
+        if entry is None:
+            entry = self.values[label_values] = [[0] * (len(self.buckets) + 1), 0.0]
+        entry[0][bisect_left(self.buckets, value)] += 1
+        entry[1] += value
+
+    def samples(self):
+        samples = []
+        for key, (counts, total) in list(self.values.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + ('+Inf',), counts):
+                cumulative += count
+                samples.append((f'{self.name}_bucket', format_labels(self.labels + ('le',), key + (bound,)), cumulative))
+            samples.append((f'{self.name}_sum', format_labels(self.labels, key), round(total, 6)))
+            samples.append((f'{self.name}_count', format_labels(self.labels, key), cumulative))
+        return samples
+
+registry = []
+
+def register(metric):
+    registry.append(metric)
+    return metric
+
+def render():
+    lines = []
+    for metric in registry:
+        lines.append(f'# HELP {metric.name} {metric.help}')
+        lines.append(f'# TYPE {metric.name} {metric.kind}')
+        for name, labels, value in metric.samples():
+            lines.append(f'{name}{labels} {value}')
+    return '\n'.join(lines) + '\n'
+
+request_latency = register(Histogram('githubwatcher_request_seconds', 'GitHub API request latency', ('repo',)))
+request_status = register(Counter('githubwatcher_requests_total', 'GitHub API responses by status', ('status',)))
+request_errors = register(Counter('githubwatcher_request_errors_total', 'GitHub API requests that failed without a response'))
+events_found = register(Counter('githubwatcher_embeds_queued_total', 'New events/releases turned into embeds'))
+events_sent = register(Counter('githubwatcher_embeds_sent_total', 'Embeds delivered to discord'))
+events_failed = register(Counter('githubwatcher_embeds_failed_total', 'Embeds discord refused for good'))
+outbox_depth = register(Gauge('githubwatcher_outbox_depth', 'Embeds waiting to be sent'))
+cycle_duration = register(Gauge('githubwatcher_last_cycle_seconds', 'Duration of the last check cycle'))
+cycle_repos = register(Gauge('githubwatcher_last_cycle_repos', 'Repositories checked in the last cycle'))
+last_tick = register(Gauge('githubwatcher_last_tick_timestamp', 'Unix time the polling loop last finished a tick'))
+# filled in by profiling.timed, github_http (fetch) and the outbox (send, labelled with the channel id)
+stage_seconds = register(Counter('githubwatcher_stage_seconds_total', 'Seconds spent in each stage of a check: fetch, decode, diff, render, send, persist', ('stage', 'repo')))
+breaker_trips = register(Counter('githubwatcher_breaker_trips_total', 'Times a repo or endpoint breaker opened after failing too often'))
+breaker_recoveries = register(Counter('githubwatcher_breaker_recoveries_total', 'Times an open breaker closed again after a successful request'))
+# 1 for every open breaker, endpoint is repo/events/releases/tag. healthy repos have no series
+breakers_open = register(Gauge('githubwatcher_breaker_open', 'Repos and endpoints currently backing off', ('repo', 'endpoint')))
+
+def per_token(value):
+    return lambda: {(token.name,): value(token) for token in token_pool.pool.tokens}
+
+rate_limit_remaining = register(Gauge('githubwatcher_rate_limit_remaining', 'GitHub core rate limit remaining', ('token',),
+                                      fn=per_token(lambda token: token.budget.remaining)))
+rate_limit_reset = register(Gauge('githubwatcher_rate_limit_reset_seconds', 'Seconds until the GitHub rate limit resets', ('token',),
+                                  fn=per_token(lambda token: round(token.budget.reset_in(), 1))))
+rate_limit_deferred = register(Counter('githubwatcher_checks_deferred_total', 'Checks pushed back to stay inside the rate limit', ('token',),
+                                       fn=per_token(lambda token: token.budget.deferred)))
+token_repos = register(Gauge('githubwatcher_token_repos', 'Repositories assigned to each token', ('token',),
+                             fn=per_token(lambda token: token.repos)))
+
+def status_label(status):
+    # 5xx are lumped together, anything else is rare enough to keep as is
+    return '5xx' if status >= 500 else str(status)
+
+started = time.time()
+
+def cycle_finished(duration, repos):
+    cycle_duration.set(round(duration, 3))
+    cycle_repos.set(repos)
+
+def tick_finished():
+    last_tick.set(round(time.time(), 3))
+
+def health():
+    # ticks with nothing due count too, a tick only takes long when a big cycle runs inside it
+    # so the limit is a few loop_time intervals rather than poll_tick
+    age = time.time() - last_tick.values.get((), started)
+    limit = health_intervals * loop_time
+    if age > limit:
+        return False, f"polling loop hasn't finished a tick in {int(age)}s (limit {limit}s)"
+    return True, f"last tick {int(age)}s ago"
@@ -0,0 +1,95 @@
+import os
+import time
+import github_http
+import logs
+from scheduler import min_poll_time
+
+# seconds between polls of an organisation feed, github's X-Poll-Interval is respected on top
+feed_poll_time = int(os.getenv('feed_poll_time', min_poll_time))
+max_feed_pages = int(os.getenv('max_catchup_pages', 10))
+log = logs.get_logger('githubwatcher.feeds')
+
+class OrgFeed:
+    # /orgs/{org}/events carries the public events of every repo in the organisation, so one
+    # conditional request covers all the watched repos in it. after a start the feed pages back
+    # to the oldest last_event_id of its watchers so they can all catch up, from then on only
+    # to the newest event it has seen. each watcher takes whatever is newer than its own cursor
+    def __init__(self, org):
+        self.org = org
+        self.url = f"{github_http.API_URL}/orgs/{org}/events"
+        self.etag = ""
+        self.last_id = 0
+        self.poll_interval = 0
+        self.next_check = 0
+
+    def covers(self, repo_config):
+        name = repo_config.get('name') or github_http.repo_name_from_url(repo_config['url'])
+        return repo_config.get('feed', True) and not repo_config.get('webhook') and name.split('/', 1)[0].lower() == self.org.lower()
+
+    def due(self):
+        return time.monotonic() >= self.next_check
+
+    async def poll(self, headers, oldest_cursor):
+        # new events newest first, down to the feed's own cursor or oldest_cursor before the first
+        # poll (just the first page when both are 0). None when nothing changed or the request failed
+        since_id = self.last_id or oldest_cursor
+        self.next_check = time.monotonic() + max(feed_poll_time, self.poll_interval)
+        token = github_http.token_for(self.url)
+        if not token.budget.allows():
+            log.warning("Feed %s: Rate limit budget spent - skipping this poll", self.org)
+            return None
+
+        request_headers = dict(headers)
+        if self.etag:
+            request_headers["if-none-match"] = self.etag
+        response = await github_http.request('GET', self.url, headers=request_headers)
+        self.poll_interval = int(response.headers.get("X-Poll-Interval", self.poll_interval))
+        if response.status == 304:
+            log.debug("Feed %s: No new events (304)", self.org)
+            return None
+        if response.status != 200:
+            log.error("Feed %s: Events API error: %s", self.org, response.status)
+            return None
+
+        etag = response.headers.get("ETag", "")
+        events = []
+        pages = 1
+        data = response.json()
+        while data:
+            for event in data:
+                if int(event['id']) <= since_id:
+                    self.seen(etag, events)
+                    return events
+                events.append(event)
+            next_url = github_http.next_link(response.headers)
+            if not since_id or not next_url or pages >= max_feed_pages:
+                break
+            if not token.budget.allows(borrow=True):
+                log.warning("Feed %s: Rate limit budget spent - stopping catch up after %s pages", self.org, pages)
+                break
+            pages += 1
+            log.debug("Feed %s: Cursor %s not reached yet, fetching page %s...", self.org, since_id, pages)
+            response = await github_http.request('GET', next_url, headers=headers, token=token, label=github_http.repo_label(self.url))
+            if response.status != 200:
+                log.error("Feed %s: Catch up page %s failed - Status: %s", self.org, pages, response.status)
+                break
+            data = response.json()
+        if since_id:
+            log.warning("Feed %s: Cursor %s not reached, older events may be missing", self.org, since_id)
+        self.seen(etag, events)
+        return events
+
+    def seen(self, etag, events):
+        self.etag = etag
+        if events:
+            self.last_id = max(self.last_id, int(events[0]['id']))
+
+def build_feeds(config, current=None):
+    # org name -> OrgFeed from the "feeds" list in config.json, feeds that were already running keep their etag
+    current = current or {}
+    feeds = {}
+    for feed_config in config.get('feeds', []):
+        org = (feed_config or {}).get('org')
+        if org:
+            feeds[org.lower()] = current.get(org.lower()) or OrgFeed(org)
+    return feeds
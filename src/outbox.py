@@ -0,0 +1,197 @@
+import os
+import time
+import asyncio
+import aiohttp
+import discord
+import logs
+import metrics
+from collections import deque
+
+outbox_interval = float(os.getenv('outbox_interval', 1))
+# discord allows 10 embeds and 6000 characters of embed text per message
+MAX_EMBEDS = 10
+MAX_EMBED_CHARS = 6000
+# longest wait before retrying a channel that couldn't be reached
+MAX_RETRY_WAIT = 300
+log = logs.get_logger('githubwatcher.outbox')
+
+class OutboxItem:
+    # embed is None for a callback that only waits for the items queued before it
+    __slots__ = ('embed', 'on_sent')
+
+    def __init__(self, embed, on_sent=None):
+        self.embed = embed
+        self.on_sent = on_sent
+
+class RetryLater(Exception):
+    # the channel can't be reached right now (rate limited, discord down, connection lost),
+    # unsent is what has to go back in the queue
+    def __init__(self, reason, unsent):
+        super().__init__(reason)
+        self.unsent = unsent
+
+class ChannelOutbox:
+    # one queue + worker per channel/thread, so a slow or rate limited channel only holds up itself
+    def __init__(self, channel_id, outbox):
+        self.channel_id = channel_id
+        self.outbox = outbox
+        self.items = deque()
+        self.in_flight = 0
+        self.retries = 0
+        # fetched from the api when it wasn't in discord.py's cache (uncached threads)
+        self.channel = None
+        self.wakeup = asyncio.Event()
+        self.worker = asyncio.ensure_future(self.run())
+
+    def put(self, item):
+        self.items.append(item)
+        self.wakeup.set()
+
+    def depth(self):
+        return len(self.items) + self.in_flight
+
+    def next_batch(self):
+        # packs as many queued embeds into one message as discord will take. callback only items
+        # come out on their own, in order
+        if self.items[0].embed is None:
+            return [self.items.popleft()]
+        batch = []
+        chars = 0
+        while self.items and self.items[0].embed is not None and len(batch) < MAX_EMBEDS:
+            size = len(self.items[0].embed)
+            if batch and chars + size > MAX_EMBED_CHARS:
+                break
+            batch.append(self.items.popleft())
+            chars += size
+        return batch
+
+    async def run(self):
+        while True:
+            if not self.items:
+                self.wakeup.clear()
+                await self.wakeup.wait()
+                continue
+
+            batch = self.next_batch()
+            self.in_flight = len(batch)
+            if batch[0].embed is None:
+                self.finished(batch)
+                continue
+            try:
+                await self.deliver(batch)
+                self.retries = 0
+            except RetryLater as e:
+                # nothing is dropped and no cursor moves past what is still unsent, the worker
+                # waits (doubling up to MAX_RETRY_WAIT) and tries the same embeds again
+                self.finished(batch[:len(batch) - len(e.unsent)])
+                self.items.extendleft(reversed(e.unsent))
+                self.retries += 1
+                wait = min(MAX_RETRY_WAIT, max(self.outbox.interval, 1) * 2 ** self.retries)
+                log.warning("Couldn't send to channel %s (%s) - %s items waiting, retrying in %ss", self.channel_id, e, len(self.items), wait)
+                await asyncio.sleep(wait)
+                continue
+            except Exception as e:
+                log.error("Error sending to channel %s: %s", self.channel_id, e)
+                self.outbox.failed += len(batch)
+                self.channel = None
+            self.finished(batch)
+            await asyncio.sleep(self.outbox.interval)
+
+    def finished(self, batch):
+        # callbacks (cursor commits) also run for embeds discord rejected for good (bad request, no
+        # permission), otherwise the same broken embed would be retried forever
+        for item in batch:
+            if item.on_sent:
+                try:
+                    item.on_sent()
+                except Exception as e:
+                    log.error("Error after sending to channel %s: %s", self.channel_id, e)
+        self.in_flight = 0
+
+    async def find_channel(self, batch):
+        # the cache first, then the api. a channel discord says is gone or off limits (deleted,
+        # bot removed from the guild, no access to the thread) raises NotFound/Forbidden, those
+        # embeds are dropped like any other rejected ones instead of waiting forever
+        channel = self.outbox.get_channel(self.channel_id) or self.channel
+        if channel is not None:
+            return channel
+        if self.outbox.fetch_channel is None:
+            raise RetryLater("channel not found", batch)
+        try:
+            self.channel = await self.outbox.fetch_channel(self.channel_id)
+        except (discord.NotFound, discord.Forbidden):
+            raise
+        except Exception as e:
+            # anything else (discord down, not logged in yet) might pass
+            raise RetryLater(f"couldn't fetch the channel: {e!r}", batch)
+        return self.channel
+
+    async def deliver(self, batch):
+        channel = await self.find_channel(batch)
+
+
+        for attempt in range(5):
+            try:
+                start = time.perf_counter()
+                await channel.send(embeds=[item.embed for item in batch])
+                metrics.stage_seconds.inc('send', str(self.channel_id), amount=time.perf_counter() - start)
+                self.outbox.sent += len(batch)
+                return
+            except (aiohttp.ClientError, asyncio.TimeoutError, OSError) as e:
+                raise RetryLater(f"connection error: {e}", batch)
+            except discord.HTTPException as e:
+                if e.status == 429:
+                    retry_after = float(e.response.headers.get('Retry-After', 1)) if e.response else 1
+                    log.warning("Rate limited by discord on channel %s - retrying in %ss", self.channel_id, retry_after)
+                    await asyncio.sleep(retry_after)
+                elif e.status >= 500:
+                    raise RetryLater(f"discord returned {e.status}", batch)
+                elif len(batch) > 1 and e.status == 400:
+                    # one bad embed shouldn't take the rest of the message down with it
+                    for i, item in enumerate(batch):
+                        try:
+                            await self.deliver([item])
+                        except RetryLater as retry:
+                            raise RetryLater(str(retry), batch[i:])
+                        except Exception as e:
+                            log.error("Error sending to channel %s: %s", self.channel_id, e)
+                            self.outbox.failed += 1
+                    return
+                else:
+                    raise
+        raise RetryLater("still rate limited after 5 attempts", batch)
+
+class Outbox:
+    # sending runs separately from polling: watchers queue embeds here and carry on,
+    # on_sent callbacks fire once the message is out
+    def __init__(self, get_channel, fetch_channel=None, interval=outbox_interval):
+        self.get_channel = get_channel
+        self.fetch_channel = fetch_channel
+        self.interval = interval
+        self.channels = {}
+        self.sent = 0
+        self.failed = 0
+
+    def send(self, channel_id, embed, on_sent=None):
+        channel_outbox = self.channels.get(channel_id)
+        if channel_outbox is None:
+            channel_outbox = self.channels[channel_id] = ChannelOutbox(channel_id, self)
+        channel_outbox.put(OutboxItem(embed, on_sent))
+
+    def pending(self, channel_id):
+        channel_outbox = self.channels.get(channel_id)
+        return channel_outbox.depth() if channel_outbox else 0
+
+    def after(self, channel_id, on_sent):
+        # runs on_sent once everything queued for channel_id so far is out, right away if nothing is
+        if not self.pending(channel_id):
+            on_sent()
+            return
+        self.channels[channel_id].put(OutboxItem(None, on_sent))
+
+    def depth(self):
+        return sum(channel_outbox.depth() for channel_outbox in self.channels.values())
+
+    async def flush(self):
+        while self.depth():
+            await asyncio.sleep(0.05)
@@ -0,0 +1,132 @@
+import os
+import time
+import pstats
+import cProfile
+import tracemalloc
+from datetime import datetime
+import logs
+import metrics
+
+# where /profile and the signals write their reports
+profile_dir = os.getenv('profile_dir', 'profiles')
+# cycles profiled when a signal starts a run, /profile takes a count
+profile_cycles = int(os.getenv('profile_cycles', 5))
+STAGES = ('fetch', 'decode', 'diff', 'render', 'send', 'persist')
+# how many functions/allocation sites and repos per stage go into a report
+REPORT_LINES = 40
+REPORT_REPOS = 10
+log = logs.get_logger('githubwatcher.profiling')
+
+class timed:
+    # with timed('render', repo): adds the time spent inside to that stage of the repo in
+    # githubwatcher_stage_seconds_total. always on, it's two perf_counter calls and a dict add
+    __slots__ = ('stage', 'repo', 'start')
+
+    def __init__(self, stage, repo):
+        self.stage = stage
+        self.repo = repo
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        metrics.stage_seconds.inc(self.stage, self.repo, amount=time.perf_counter() - self.start)
+
+class ProfileRun:
+    # cProfile and/or tracemalloc for the next few cycles. cProfile is only switched on while one
+    # of the cycles runs, tracemalloc from the first one until the report is written. with no run
+    # going the cycle hooks below are a single None check
+    def __init__(self, cycles, cpu=True, memory=False):
+        self.cycles = cycles
+        self.done = 0
+        self.profiler = cProfile.Profile() if cpu else None
+        self.memory = memory
+        self.snapshot = None
+        self.stages = dict(metrics.stage_seconds.values)
+        self.started = datetime.now()
+        self.elapsed = 0.0
+        self.cycle_start = 0.0
+
+    def resume(self):
+        if self.memory and not tracemalloc.is_tracing():
+            tracemalloc.start(10)
+            self.snapshot = self.snapshot or tracemalloc.take_snapshot()
+        if self.profiler:
+            self.profiler.enable()
+        self.cycle_start = time.perf_counter()
+
+    def pause(self):
+        self.elapsed += time.perf_counter() - self.cycle_start
+        if self.profiler:
+            self.profiler.disable()
+        self.done += 1
+
+    def write(self):
+        # <profile_dir>/cycles-<time>.txt with the stage breakdown and the top functions/allocations,
+        # plus cycles-<time>.prof for snakeviz/pstats when cProfile ran. returns the .txt path
+        os.makedirs(profile_dir, exist_ok=True)
+        base = os.path.join(profile_dir, f"cycles-{self.started.strftime('%Y%m%d-%H%M%S')}")
+        with open(f"{base}.txt", 'w') as f:
+            f.write(f"{self.done} cycles, {self.elapsed:.3f}s inside them, started {self.started.isoformat(timespec='seconds')}\n\n")
+            self.write_stages(f)
+            # memory first, so the report itself doesn't show up in the allocations
+            if self.memory:
+                self.write_memory(f)
+            if self.profiler:
+                self.profiler.dump_stats(f"{base}.prof")
+                f.write(f"\ncProfile, top {REPORT_LINES} by cumulative time (all of it in {base}.prof)\n")
+                stats = pstats.Stats(self.profiler, stream=f)
+                stats.sort_stats('cumulative').print_stats(REPORT_LINES)
+        return f"{base}.txt"
+
+    def write_stages(self, f):
+        per_stage = {}
+        for (stage, repo), seconds in metrics.stage_seconds.values.items():
+            seconds -= self.stages.get((stage, repo), 0)
+            if seconds > 0:
+                per_stage.setdefault(stage, []).append((seconds, repo))
+        f.write("seconds per stage (the top repos for each, send is per channel)\n")
+        for stage in STAGES:
+            entries = sorted(per_stage.get(stage, []), reverse=True)
+            f.write(f"  {stage:8} {sum(seconds for seconds, _ in entries):10.4f}s\n")
+            for seconds, repo in entries[:REPORT_REPOS]:
+                f.write(f"      {seconds:10.4f}s  {repo}\n")
+
+    def write_memory(self, f):
+        if not tracemalloc.is_tracing():
+            return
+        current, peak = tracemalloc.get_traced_memory()
+        f.write(f"\ntracemalloc: {current / 1024 / 1024:.1f} MB traced now, {peak / 1024 / 1024:.1f} MB peak\n")
+        f.write(f"top {REPORT_LINES} allocation sites that grew over the run\n")
+        for stat in tracemalloc.take_snapshot().compare_to(self.snapshot, 'lineno')[:REPORT_LINES]:
+            f.write(f"  {stat}\n")
+        tracemalloc.stop()
+
+run = None
+
+def start(cycles=profile_cycles, cpu=True, memory=False):
+    # returns False if a run is already going
+    global run
+    if run is not None:
+        return False
+    run = ProfileRun(max(cycles, 1), cpu, memory)
+    log.header("Profiling the next %s cycles (cProfile: %s, tracemalloc: %s)", run.cycles, cpu, memory)
+    return True
+
+def cycle_started():
+    if run is not None:
+        run.resume()
+
+def cycle_finished():
+    global run
+    if run is None:
+        return
+    run.pause()
+    if run.done < run.cycles:
+        return
+    finished, run = run, None
+    try:
+        log.header("Profile of %s cycles written to %s", finished.done, finished.write())
+    except Exception as e:
+        log.exception("Error writing profile: %s", e)
@@ -0,0 +1,97 @@
+import os
+import time
+
+class RateLimitBudget:
+    # process wide view of the github core rate limit, fed from the X-RateLimit-* headers
+    # every api response already carries, so nothing has to poll /rate_limit.
+    # requests are handed out from a token bucket that refills at the rate which spreads
+    # whatever is left evenly until the reset time. nothing ever waits for it: a check the
+    # bucket can't cover right now is deferred to its next turn. requests are charged once their
+    # response is in and only when github counts them, so 304s and shared cache hits are free.
+    # clock (the refill's) is swapped for a simulated one by bench/bench_cycle.py --scheduled
+    def __init__(self, reserve=10, burst=100, clock=time.monotonic):
+        self.reserve = reserve
+        self.burst = burst
+        self.limit = None
+        self.remaining = None
+        self.reset = 0
+        self.tokens = float(burst)
+        self.clock = clock
+        self.refilled = clock()
+        self.deferred = 0
+
+    def update(self, headers):
+        remaining = headers.get('X-RateLimit-Remaining')
+        if remaining is None or headers.get('X-RateLimit-Resource', 'core') != 'core':
+            return
+        remaining = int(remaining)
+        reset = int(headers.get('X-RateLimit-Reset', 0))
+        # concurrent responses arrive out of order, within one window only ever move the count down
+        if self.remaining is None or reset > self.reset or (reset == self.reset and remaining < self.remaining):
+            self.remaining = remaining
+            self.reset = reset
+            self.limit = int(headers.get('X-RateLimit-Limit', self.limit or 0))
+
+    def reset_in(self):
+        return max(self.reset - time.time(), 0)
+
+    def fair_rate(self):
+        # requests per second that would use up the budget exactly at the reset,
+        # None when we don't know (no response seen yet, or the window has already reset)
+        if self.remaining is None or time.time() >= self.reset:
+            return None
+        spare = self.remaining - self.reserve
+        if spare <= 0:
+            return 0
+        return spare / max(self.reset_in(), 1)
+
+    def _refill(self):
+        now = self.clock()
+        rate = self.fair_rate()
+        if rate is None:
+            self.tokens = float(self.burst)
+        else:
+            # never hand out more than github says is left, whatever the burst size
+            self.tokens = min(self.tokens + (now - self.refilled) * rate, self.burst, self.remaining - self.reserve)
+        self.refilled = now
+
+    def wait_time(self, cost=1):
+        # seconds until `cost` requests may go out, None if the budget is spent until the reset
+        self._refill()
+        if self.tokens >= cost:
+            return 0
+        rate = self.fair_rate()
+        if not rate:
+            return None
+        return (cost - self.tokens) / rate
+
+    def allows(self, cost=1, borrow=False):
+        # whether `cost` requests may go out now. borrow: also when the bucket is empty (catch up
+        # pages, which can't be put off without losing events), just not when the budget is
+        # spent until the reset
+        wait = self.wait_time(cost)
+        if wait is None or (wait and not borrow):
+            self.deferred += 1
+            return False
+        return True
+
+    def charge(self, cost=1):
+        # never below empty: the refill rate already comes down with what github says is left,
+        # debt on top would count the same requests twice (startup, catch up pages)
+        self.tokens = max(self.tokens - cost, 0)
+
+    def state(self):
+        self._refill()
+        return {
+            "limit": self.limit,
+            "remaining": self.remaining,
+            "reset": self.reset,
+            "reset_in": round(self.reset_in()),
+            "fair_rate": self.fair_rate(),
+            "tokens": round(self.tokens, 2),
+            "deferred": self.deferred,
+        }
+
+# every token in the pool (token_pool.py) gets its own budget with these settings
+rate_limit_reserve = int(os.getenv('rate_limit_reserve', 10))
+rate_limit_burst = int(os.getenv('rate_limit_burst', 100))
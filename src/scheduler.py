@@ -0,0 +1,113 @@
+import os
+import time
+import heapq
+import random
+import itertools
+
+loop_time = int(os.getenv('loop_time', 300))
+min_poll_time = int(os.getenv('min_poll_time', 60))
+max_poll_time = int(os.getenv('max_poll_time', loop_time * 6))
+poll_backoff = float(os.getenv('poll_backoff', 1.5))
+
+# repos that only watch releases get polled less often, releases are rare compared to pushes/stars
+RELEASE_ONLY_FACTOR = 2
+RELEASE_EVENTS = ("ReleaseEvent", "TaggedReleaseEvent")
+
+def next_interval(watcher):
+    # how long until the watcher should be checked again
+    #  - starts from loop_time, stretched for release only repos
+    #  - backs off by poll_backoff for every check in a row that found nothing (304s)
+    #  - drops to min_poll_time right after something new showed up
+    #  - never goes below the X-Poll-Interval github asked for
+    if watcher.idle_streak == 0:
+        interval = min_poll_time
+    else:
+        interval = loop_time * poll_backoff ** (watcher.idle_streak - 1)
+    if all(event in RELEASE_EVENTS for event in watcher.tracked_events):
+        interval *= RELEASE_ONLY_FACTOR
+    interval = min(interval, max_poll_time)
+    interval = max(interval, min_poll_time)
+    # a little jitter so watchers that started together drift apart
+    return max(interval * random.uniform(0.9, 1.1), watcher.poll_interval)
+
+def group_key(watcher):
+    # watchers of the same repo (same events url) share their requests through shared_fetch, which
+    # only works if they're checked together, so they're scheduled as one group
+    return watcher.url
+
+class PollScheduler:
+    # priority queue of (due time, group), every group of watchers has its own next due time. a
+    # group is due as soon as its most eager member wants to be checked again. clock is swapped
+    # for a simulated one by bench/bench_cycle.py --scheduled
+    def __init__(self, clock=time.monotonic):
+        self.heap = []
+        self.entries = {}
+        self.groups = {}
+        self.group_of = {}
+        self.counter = itertools.count()
+        self.clock = clock
+
+    def __len__(self):
+        return len(self.group_of)
+
+    def schedule(self, watcher, delay):
+        # joins the watcher's group, which is then due at its current due time or after delay,
+        # whichever comes first
+        key = self.group_of.get(watcher)
+        if key is None:
+            key = self.group_of[watcher] = group_key(watcher)
+            self.groups.setdefault(key, []).append(watcher)
+        due = self.clock() + delay
+        entry = self.entries.get(key)
+        if entry is not None:
+            if entry[0] <= due:
+                return
+            entry[2] = None
+        entry = [due, next(self.counter), key]
+        self.entries[key] = entry
+        heapq.heappush(self.heap, entry)
+
+    def remove(self, watcher):
+        # entries are dropped lazily, the heap just skips them when they come up
+        key = self.group_of.pop(watcher, None)
+        if key is None:
+            return
+        members = self.groups[key]
+        members.remove(watcher)
+        if not members:
+            del self.groups[key]
+            entry = self.entries.pop(key, None)
+            if entry:
+                entry[2] = None
+
+    def stagger(self, watchers, spread=None):
+        # spread the first checks out over one interval instead of firing them all at once,
+        # watchers of the same group start together
+        spread = loop_time if spread is None else spread
+        keys = [self.group_of.get(watcher) or group_key(watcher) for watcher in watchers]
+        slot = {key: i for i, key in enumerate(dict.fromkeys(keys))}
+        for watcher, key in zip(watchers, keys):
+            self.schedule(watcher, spread * slot[key] / len(slot))
+
+    def reschedule(self, watcher):
+        self.schedule(watcher, next_interval(watcher))
+
+    def pop_due(self, now=None):
+        # the watchers of every due group, they stay in their group until removed
+        now = self.clock() if now is None else now
+        due = []
+        while self.heap and self.heap[0][0] <= now:
+            entry = heapq.heappop(self.heap)
+            key = entry[2]
+            if key is None:
+                continue
+            del self.entries[key]
+            due.extend(self.groups[key])
+        return due
+
+    def next_due_in(self):
+        while self.heap and self.heap[0][2] is None:
+            heapq.heappop(self.heap)
+        if not self.heap:
+            return None
+        return max(self.heap[0][0] - self.clock(), 0)
@@ -0,0 +1,51 @@
+import os
+from array import array
+from bisect import bisect_left
+
+# how many event ids a repo remembers, github never serves more than the newest 300 events
+seen_ids_size = int(os.getenv('seen_ids_size', 300))
+# releases come 10 to a page and far less often
+RELEASE_SEEN_SIZE = 100
+
+class SeenIds:
+    # the ids a repo has already handled (events or releases), bounded to the newest `size`.
+    # picking new items off a page is a lookup per item, so it doesn't matter if github serves
+    # them out of order or one shows up late. ids at or below floor count as seen too: those
+    # pushed out of the window, or the last_*_id of state saved before this existed.
+    # the ids are a sorted array of int64 (8 bytes each instead of a set of int objects, which
+    # matters with thousands of repos), lookups are a bisect. the array is never changed in place,
+    # update swaps in a new one, so state() can hand it out to the cursors without copying
+    __slots__ = ('ids', 'floor', 'size')
+
+    def __init__(self, ids=(), floor=0, size=seen_ids_size):
+        self.floor = floor
+        self.size = size
+        self.ids = array('q')
+        self.update(ids)
+
+    def __contains__(self, item_id):
+        if item_id <= self.floor:
+            return True
+        i = bisect_left(self.ids, item_id)
+        return i < len(self.ids) and self.ids[i] == item_id
+
+    def __bool__(self):
+        return bool(self.ids) or self.floor > 0
+
+    def update(self, item_ids):
+        # once full the lowest ids go, ids only ever go up so those are the oldest
+        new_ids = {item_id for item_id in item_ids if item_id not in self}
+        if not new_ids:
+            return
+        ids = sorted(new_ids.union(self.ids))
+        if len(ids) > self.size:
+            self.floor = ids[-self.size - 1]
+            ids = ids[-self.size:]
+        self.ids = array('q', ids)
+
+    def add(self, item_id):
+        self.update((item_id,))
+
+    def state(self):
+        # (ids, floor) for a cursor or the state store, which writes the array as a list
+        return self.ids, self.floor
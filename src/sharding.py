@@ -0,0 +1,92 @@
+import os
+import time
+import bisect
+import hashlib
+
+# give every instance its own shard_name to split the repos between them. the instances find
+# each other through heartbeats in the state database, so they have to share the same state_file
+shard_name = os.getenv('shard_name', '')
+shard_heartbeat = int(os.getenv('shard_heartbeat', 15))
+# an instance that hasn't sent a heartbeat for this long is gone and its repos get picked up by the others
+shard_timeout = int(os.getenv('shard_timeout', shard_heartbeat * 4))
+# points per instance on the ring, more = a more even split
+VIRTUAL_NODES = 64
+
+def enabled():
+    return bool(shard_name)
+
+def ring_hash(value):
+    return int.from_bytes(hashlib.md5(value.encode()).digest()[:8], 'big')
+
+class HashRing:
+    # consistent hashing: when an instance joins or leaves only the repos next to its points move
+    def __init__(self, members, virtual_nodes=VIRTUAL_NODES):
+        points = sorted((ring_hash(f"{member}#{i}"), member) for member in members for i in range(virtual_nodes))
+        self.hashes = [point for point, _ in points]
+        self.members = [member for _, member in points]
+
+    def owner(self, key):
+        if not self.hashes:
+            return None
+        return self.members[bisect.bisect(self.hashes, ring_hash(key)) % len(self.hashes)]
+
+class Shard:
+    # the ring decides which instance should poll a repo, a lease in the database decides which one
+    # actually does. a repo is only picked up once the previous owner let go of its lease (after
+    # everything it queued for that repo was sent) or the lease ran out, so two instances never
+    # poll and post the same repo at the same time
+    def __init__(self, conn, name=shard_name, heartbeat=shard_heartbeat, timeout=shard_timeout):
+        self.conn = conn
+        self.name = name
+        self.heartbeat = heartbeat
+        self.timeout = timeout
+        self.members = ()
+        self.ring = HashRing(())
+        self.last_rebalance = 0
+        with self.conn:
+            self.conn.execute("CREATE TABLE IF NOT EXISTS shard_members (name TEXT PRIMARY KEY, heartbeat REAL NOT NULL)")
+            self.conn.execute("CREATE TABLE IF NOT EXISTS repo_leases (key TEXT PRIMARY KEY, owner TEXT NOT NULL, expires REAL NOT NULL)")
+
+    def rebalance_due(self):
+        return time.time() - self.last_rebalance >= self.heartbeat
+
+    def beat(self):
+        # records our heartbeat, forgets instances that stopped sending theirs and rebuilds the
+        # ring if the set of instances changed. returns whether it did
+        now = time.time()
+        with self.conn:
+            self.conn.execute("INSERT INTO shard_members (name, heartbeat) VALUES (?, ?) "
+                              "ON CONFLICT(name) DO UPDATE SET heartbeat = excluded.heartbeat", (self.name, now))
+            self.conn.execute("DELETE FROM shard_members WHERE heartbeat < ?", (now - self.timeout,))
+        members = tuple(name for (name,) in self.conn.execute("SELECT name FROM shard_members ORDER BY name"))
+        if members == self.members:
+            return False
+        self.members = members
+        self.ring = HashRing(members)
+        return True
+
+    def owns(self, key):
+        return self.ring.owner(key) == self.name
+
+    def acquire(self, keys):
+        # takes or renews the lease of every key that is free, expired or already ours,
+        # returns the keys we hold afterwards
+        now = time.time()
+        with self.conn:
+            self.conn.executemany(
+                "INSERT INTO repo_leases (key, owner, expires) VALUES (?, ?, ?) "
+                "ON CONFLICT(key) DO UPDATE SET owner = excluded.owner, expires = excluded.expires "
+                "WHERE repo_leases.owner = excluded.owner OR repo_leases.expires < ?",
+                [(key, self.name, now + self.timeout, now) for key in keys]
+            )
+        return {key for (key,) in self.conn.execute("SELECT key FROM repo_leases WHERE owner = ?", (self.name,))} & set(keys)
+
+    def release(self, keys):
+        with self.conn:
+            self.conn.executemany("DELETE FROM repo_leases WHERE key = ? AND owner = ?", [(key, self.name) for key in keys])
+
+    def leave(self):
+        # lets the other instances take over right away instead of waiting out the timeout
+        with self.conn:
+            self.conn.execute("DELETE FROM repo_leases WHERE owner = ?", (self.name,))
+            self.conn.execute("DELETE FROM shard_members WHERE name = ?", (self.name,))
@@ -0,0 +1,97 @@
+import os
+import time
+import asyncio
+from collections import Counter
+import github_http
+
+shared_fetch_ttl = int(os.getenv('shared_fetch_ttl', 30))
+
+class CacheEntry:
+    __slots__ = ('etag', 'headers', 'parsed', 'fetched')
+
+    def __init__(self, etag, headers, parsed, fetched):
+        self.etag = etag
+        self.headers = headers
+        self.parsed = parsed
+        self.fetched = fetched
+
+class SharedFetcher:
+    # when several watchers point at the same url (same repo in the config more than once),
+    # the url is fetched once: identical requests in flight are merged, and the last etag +
+    # parsed body are kept for shared_fetch_ttl seconds and handed to every watcher.
+    # urls with a single watcher go straight through without caching anything. the scheduler
+    # checks watchers of the same repo in the same tick, so they all land within the ttl.
+    # clock is swapped for a simulated one by bench/bench_cycle.py --scheduled
+    def __init__(self, ttl=shared_fetch_ttl, clock=time.monotonic):
+        self.ttl = ttl
+        self.clock = clock
+        self.subscribers = Counter()
+        self.cache = {}
+        self.inflight = {}
+
+    def subscribe(self, url):
+        self.subscribers[url] += 1
+
+    def unsubscribe(self, url):
+        self.subscribers[url] -= 1
+        if self.subscribers[url] <= 0:
+            del self.subscribers[url]
+            self.cache.pop(url, None)
+
+    async def fetch(self, url, headers):
+        etag = headers.get("if-none-match", "")
+        if self.subscribers[url] < 2:
+            return await github_http.request('GET', url, headers=headers)
+
+        entry = self.cache.get(url)
+        if entry is None or self.clock() - entry.fetched > self.ttl:
+            response = await self.refresh(url, headers)
+            if response.status not in (200, 304):
+                return response
+            entry = self.cache[url]
+
+        if entry.parsed is None and etag != entry.etag:
+            # we only know the etag (a 304 on a cold cache) and this watcher needs the body
+            response = await self.refresh(url, headers, force=True)
+            if response.status != 200:
+                return response
+            entry = self.cache[url]
+
+        # every watcher keeps its own etag, so a cached body is still a 200 for a watcher that hasn't seen it
+        if etag and etag == entry.etag:
+            return github_http.Response(304, entry.headers, b'', url)
+        return github_http.Response(200, entry.headers, None, url, entry.parsed)
+
+    async def refresh(self, url, headers, force=False):
+        key = (url, force)
+        task = self.inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(self._refresh(url, headers, force))
+            self.inflight[key] = task
+            task.add_done_callback(lambda _: self.inflight.pop(key, None))
+        # shielded so one watcher being cancelled doesn't cancel the request for the others
+        return await asyncio.shield(task)
+
+    async def _refresh(self, url, headers, force):
+        entry = self.cache.get(url)
+        request_headers = dict(headers)
+        if force:
+            request_headers.pop("if-none-match", None)
+            request_headers.pop("if-modified-since", None)
+        elif entry and entry.parsed is not None:
+            request_headers["if-none-match"] = entry.etag
+            request_headers.pop("if-modified-since", None)
+
+        response = await github_http.request('GET', url, headers=request_headers)
+        now = self.clock()
+        if response.status == 200:
+            self.cache[url] = CacheEntry(response.headers.get("ETag", ""), response.headers, response.json(), now)
+        elif response.status == 304:
+            if entry and entry.parsed is not None:
+                entry.headers = response.headers
+                entry.fetched = now
+            else:
+                self.cache[url] = CacheEntry(request_headers.get("if-none-match", ""), response.headers, None, now)
+        return response
+
+fetcher = SharedFetcher()
@@ -0,0 +1,43 @@
+import os
+import json
+import time
+import sqlite3
+
+STATE_FILE = os.getenv('state_file', 'state.db')
+
+class StateStore:
+    # machine written per repo state (etags, last seen ids, asset ids...) lives here instead of
+    # being written back into config.json, which is left for the user to edit.
+    # one json row per repo key, sqlite in WAL mode so a crash mid write can't corrupt anything
+    def __init__(self, path=STATE_FILE):
+        self.path = path
+        self.conn = sqlite3.connect(path)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute("CREATE TABLE IF NOT EXISTS repo_state (key TEXT PRIMARY KEY, state TEXT NOT NULL, updated REAL NOT NULL)")
+        self.conn.commit()
+
+    def load(self, key):
+        row = self.conn.execute("SELECT state FROM repo_state WHERE key = ?", (key,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def load_all(self):
+        return {key: json.loads(state) for key, state in self.conn.execute("SELECT key, state FROM repo_state")}
+
+    def save(self, states):
+        # states is {key: state dict}, written in a single transaction. the watchers keep their
+        # id lists as arrays, those are written as plain json lists
+        now = time.time()
+        with self.conn:
+            self.conn.executemany(
+                "INSERT INTO repo_state (key, state, updated) VALUES (?, ?, ?) "
+                "ON CONFLICT(key) DO UPDATE SET state = excluded.state, updated = excluded.updated",
+                [(key, json.dumps(state, default=list), now) for key, state in states.items()]
+            )
+
+    def delete(self, key):
+        with self.conn:
+            self.conn.execute("DELETE FROM repo_state WHERE key = ?", (key,))
+
+    def close(self):
+        self.conn.close()
@@ -0,0 +1,58 @@
+import os
+import rate_limit
+
+# comma separated personal access tokens (or already minted app installation tokens),
+# git_token on its own still works for a single token
+git_tokens = [token.strip() for token in os.getenv('git_tokens', os.getenv('git_token', '')).split(',') if token.strip()]
+# what a token we haven't had a response for yet is assumed to have left
+DEFAULT_LIMIT = 5000
+
+class PooledToken:
+    __slots__ = ('name', 'headers', 'budget', 'repos')
+
+    def __init__(self, name, token):
+        # name is what shows up in logs/metrics, the token itself never does
+        self.name = name
+        self.headers = {"authorization": f"token {token}"} if token else {}
+        self.budget = rate_limit.RateLimitBudget(reserve=rate_limit.rate_limit_reserve, burst=rate_limit.rate_limit_burst)
+        self.repos = 0
+
+    def headroom(self):
+        # requests left per repo already on this token, so new repos spread out over the pool
+        remaining = self.budget.remaining if self.budget.remaining is not None else DEFAULT_LIMIT
+        return (remaining - self.budget.reserve) / (self.repos + 1)
+
+    def spent(self):
+        return self.budget.wait_time() is None
+
+class TokenPool:
+    # every repo sticks to one token, etags are tied to the credential that fetched them so
+    # switching would turn the next 304 into a full 200. a repo only moves when its token is
+    # spent until the reset and another one still has requests left
+    def __init__(self, tokens):
+        self.tokens = [PooledToken(f"token{i + 1}", token) for i, token in enumerate(tokens)] or [PooledToken("anonymous", None)]
+        self.assigned = {}
+
+    def for_key(self, key):
+        token = self.assigned.get(key)
+        if token is not None and (len(self.tokens) == 1 or not token.spent()):
+            return token
+        best = max(self.tokens, key=PooledToken.headroom)
+        if token is None or (best is not token and not best.spent()):
+            if token is not None:
+                token.repos -= 1
+            best.repos += 1
+            self.assigned[key] = token = best
+        return token
+
+    def state(self):
+        # totals over the pool for the cycle log line
+        known = [token.budget for token in self.tokens if token.budget.remaining is not None]
+        return {
+            "tokens": len(self.tokens),
+            "limit": sum(budget.limit for budget in known) if known else None,
+            "remaining": sum(budget.remaining for budget in known) if known else None,
+            "reset_in": round(max(budget.reset_in() for budget in known)) if known else None,
+        }
+
+pool = TokenPool(git_tokens)
@@ -1,16 +1,74 @@
-from flask import Flask
-from threading import Thread
+import os
+import json
+import metrics
+import webhooks
+from urllib.parse import parse_qs
 
-app = Flask('')
+# 127.0.0.1 keeps it local, github can only reach /github/webhook through a reverse proxy or with 0.0.0.0
+http_host = os.getenv('http_host', '127.0.0.1')
+http_port = int(os.getenv('http_port', 8080))
 
-@app.route('/')
-def home():
-    return "Hello. I am alive!"
+# the keep alive server runs on the bot's own event loop, it only ever reads a few numbers or hands
+# a webhook delivery over, so there is no need for a second framework in a thread
+runner = None
+# set by keep_alive, gets (event name, delivery id, payload) and returns False if the bot isn't ready for it
+webhook_handler = None
 
-def run():
-  app.run(host='127.0.0.1',port=8080)
+async def keep_alive(on_webhook=None):
+    global runner, webhook_handler
+    if runner is not None:
+        return
+    # aiohttp.web is only needed once the bot starts
+    from aiohttp import web
+    webhook_handler = on_webhook
 
-def keep_alive():
-    t = Thread(target=run)
-    t.daemon = True 
-    t.start()
\ No newline at end of file
+    def text(body, status=200):
+        return web.Response(text=body, status=status, content_type='text/plain')
+
+    async def home(request):
+        return text("Hello. I am alive!")
+
+    async def prometheus_metrics(request):
+        response = text(metrics.render())
+        response.headers['Content-Type'] = 'text/plain; version=0.0.4'
+        return response
+
+    async def healthz(request):
+        healthy, message = metrics.health()
+        return text(message, 200 if healthy else 503)
+
+    async def github_webhook(request):
+        if webhook_handler is None or not webhooks.enabled():
+            return text("webhooks are off", 404)
+        body = await request.read()
+        if not webhooks.verify(body, request.headers.get('X-Hub-Signature-256', '')):
+            return text("bad signature", 401)
+
+        event_name = request.headers.get('X-GitHub-Event', '')
+        if event_name == 'ping':
+            return text("pong")
+        try:
+            # the webhook content type can be json or a form with the json in "payload"
+            if request.content_type == 'application/x-www-form-urlencoded':
+                body = parse_qs(body.decode())['payload'][0]
+            payload = json.loads(body)
+        except (KeyError, ValueError):
+            return text("bad payload", 400)
+        if not webhook_handler(event_name, request.headers.get('X-GitHub-Delivery', ''), payload):
+            return text("not ready", 503)
+        return text("accepted", 202)
+
+    app = web.Application()
+    app.router.add_get('/', home)
+    app.router.add_get('/metrics', prometheus_metrics)
+    app.router.add_get('/healthz', healthz)
+    app.router.add_post('/github/webhook', github_webhook)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, http_host, http_port).start()
+
+async def stop():
+    global runner
+    if runner is not None:
+        await runner.cleanup()
+        runner = None
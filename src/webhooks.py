@@ -0,0 +1,74 @@
+import os
+import hmac
+import hashlib
+from collections import deque
+
+# the secret set on the github webhook, without it /github/webhook refuses everything
+webhook_secret = os.getenv('webhook_secret', '')
+# github redelivers after a timeout or from the "redeliver" button, this many delivery ids are remembered
+RECENT_DELIVERIES = 1000
+
+# webhook event name -> the events api type decode/make_embed know, "release" goes to the releases path
+EVENT_TYPES = {
+    "push": "PushEvent",
+    "issues": "IssuesEvent",
+    "issue_comment": "IssueCommentEvent",
+    "pull_request": "PullRequestEvent",
+    "fork": "ForkEvent",
+    "watch": "WatchEvent",
+    "release": "ReleaseEvent",
+}
+
+def enabled():
+    return bool(webhook_secret)
+
+def verify(body, signature):
+    # X-Hub-Signature-256 is "sha256=" + the hmac of the raw body
+    if not webhook_secret or not signature.startswith('sha256='):
+        return False
+    expected = 'sha256=' + hmac.new(webhook_secret.encode(), body, hashlib.sha256).hexdigest()
+    return hmac.compare_digest(expected, signature)
+
+def normalise_push(payload):
+    # the webhook push payload names a few things differently from the events api one
+    commits = payload.get('commits') or []
+    return {
+        "ref": payload.get('ref'),
+        "before": payload.get('before'),
+        "head": payload.get('after'),
+        "size": len(commits),
+        "commits": [{"sha": c['id'], "url": c['url'], "message": c['message'], "author": {"name": c['author']['name']}} for c in commits],
+    }
+
+def to_event(event_name, delivery_id, payload):
+    # a delivery in the shape of an events api event (the delivery id stands in for the event id),
+    # None for events there is nothing to show for
+    event_type = EVENT_TYPES.get(event_name)
+    if event_type is None or not payload.get('repository'):
+        return None
+    sender = payload.get('sender') or {}
+    return {
+        "id": delivery_id,
+        "type": event_type,
+        "actor": {"login": sender.get('login', ''), "avatar_url": sender.get('avatar_url', '')},
+        "repo": {"name": payload['repository']['full_name']},
+        "payload": normalise_push(payload) if event_name == "push" else payload,
+    }
+
+class RecentDeliveries:
+    def __init__(self, size=RECENT_DELIVERIES):
+        self.ids = set()
+        self.order = deque()
+        self.size = size
+
+    def first_time(self, delivery_id):
+        # True the first time a delivery id shows up, False for redeliveries
+        if not delivery_id:
+            return True
+        if delivery_id in self.ids:
+            return False
+        self.ids.add(delivery_id)
+        self.order.append(delivery_id)
+        if len(self.order) > self.size:
+            self.ids.discard(self.order.popleft())
+        return True